@@ -6,18 +6,20 @@ def create_app():
     app = Flask(__name__)
     
     # 配置 CORS
-    CORS(app, resources={r"/api/*": {"origins": CORS_ORIGINS}})
+    CORS(app, resources={r"/api/*": {"origins": CORS_ORIGINS}}, expose_headers=["X-Next-Cursor", "X-Total-Count"])
     
     # 導入並註冊藍圖
     from app.routes.auth import auth_bp
     from app.routes.restaurants import restaurants_bp
     from app.routes.favorites import favorites_bp
     from app.routes.places import places_bp
+    from app.routes.events import events_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(restaurants_bp, url_prefix='/api/restaurants')
     app.register_blueprint(favorites_bp, url_prefix='/api/favorites')
     app.register_blueprint(places_bp, url_prefix='/api/places')
+    app.register_blueprint(events_bp, url_prefix='/api/events')
     
     # 註冊錯誤處理
     @app.errorhandler(404)
@@ -33,4 +35,34 @@ def create_app():
     def ping():
         return {"message": "pong"}
     
+    # 效能統計
+    @app.route('/api/stats')
+    def stats():
+        from app.utils.db import get_pool_stats
+        from app.utils.http import get_http_stats
+        from app.utils.place_details import get_details_stats
+        from app.utils.singleflight import get_singleflight_stats
+        from app.utils.photo_cache import photo_cache
+        from app.utils.photos import photo_uri_cache
+        from app.utils.photo_warmer import photo_warmer
+        from app.utils.auth import user_cache
+        from app.utils.google_certs import google_verifier
+        from app.utils.favorite_ids import favorite_ids
+        from app.utils.event_log import swipe_event_log
+        from app.routes.restaurants import nearby_cache
+        return {
+            "db_pool": get_pool_stats(),
+            "http": get_http_stats(),
+            "nearby_cache": nearby_cache.stats(),
+            "place_details": get_details_stats(),
+            "photo_cache": photo_cache.stats(),
+            "photo_uri_cache": photo_uri_cache.stats(),
+            "photo_warmer": photo_warmer.stats(),
+            "auth_user_cache": user_cache.stats(),
+            "google_certs": google_verifier.stats(),
+            "favorite_ids": favorite_ids.stats(),
+            "swipe_events": swipe_event_log.stats(),
+            "singleflight": get_singleflight_stats()
+        }
+    
     return app 
\ No newline at end of file
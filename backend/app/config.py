@@ -13,14 +13,87 @@ MYSQL_CONFIG = {
     'port': int(os.getenv('DB_PORT', '3306'))
 }
 
+# 資料庫連線池配置
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))  # 等待可用連線的秒數
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '3600'))  # 連線使用超過此秒數後重建
+DB_POOL_HEALTH_CHECK_INTERVAL = int(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '30'))  # 閒置超過此秒數時借用前先 ping
+
 # 應用配置
 SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-jwt-secret-key-here')
 JWT_ACCESS_TOKEN_EXPIRES = 60 * 60 * 24  # 24 hours
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '60'))  # 登入檢查時用戶資料在記憶體中保存的秒數
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_USER_CACHE_MAX_ENTRIES', '10000'))
+AUTH_TRUST_TOKEN_CLAIMS = os.getenv('AUTH_TRUST_TOKEN_CLAIMS', 'False').lower() in ('true', '1', 't')  # 直接信任 token 內的姓名與 email，不查詢資料庫
+FAVORITE_IDS_CACHE_TTL = int(os.getenv('FAVORITE_IDS_CACHE_TTL', '600'))  # 用戶收藏狀態在記憶體中保存的秒數
+FAVORITE_IDS_CACHE_MAX_USERS = int(os.getenv('FAVORITE_IDS_CACHE_MAX_USERS', '10000'))
+FAVORITE_IDS_MAX_PER_USER = int(os.getenv('FAVORITE_IDS_MAX_PER_USER', '5000'))  # 單一用戶最多記錄的餐廳收藏狀態數
 
 # Google API 配置
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID', '')
 GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY', '')
+GOOGLE_CERTS_REFRESH_MARGIN = int(os.getenv('GOOGLE_CERTS_REFRESH_MARGIN', '300'))  # 憑證到期前多少秒開始背景刷新
+GOOGLE_CERTS_DEFAULT_TTL = int(os.getenv('GOOGLE_CERTS_DEFAULT_TTL', '3600'))  # 回應沒有 max-age 時憑證保存的秒數
+GOOGLE_CERTS_MIN_FORCED_INTERVAL = int(os.getenv('GOOGLE_CERTS_MIN_FORCED_INTERVAL', '60'))  # 遇到未知 key id 時兩次強制刷新的最短間隔秒數
+
+# 對外 HTTP 請求配置（所有 Google API 呼叫共用）
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '20'))  # 每個主機保留的 keep-alive 連線數
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '2'))
+HTTP_BACKOFF_BASE = float(os.getenv('HTTP_BACKOFF_BASE', '0.2'))  # 重試退避的基準秒數
+HTTP_BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', '2'))
+HTTP_BREAKER_THRESHOLD = int(os.getenv('HTTP_BREAKER_THRESHOLD', '5'))  # 連續失敗幾次後開啟斷路器
+HTTP_BREAKER_RESET = float(os.getenv('HTTP_BREAKER_RESET', '30'))  # 斷路器開啟後多少秒再試探
+HTTP_STREAM_CHUNK_SIZE = int(os.getenv('HTTP_STREAM_CHUNK_SIZE', str(64 * 1024)))  # 串流轉發照片時每塊的位元組數
+
+# 附近餐廳搜尋配置
+NEARBY_SEARCH_MODE = os.getenv('NEARBY_SEARCH_MODE', 'hybrid')  # hybrid: 區域覆蓋夠新時從本地資料庫查詢；google: 每次都呼叫 Google
+NEARBY_COVERAGE_TTL = int(os.getenv('NEARBY_COVERAGE_TTL', str(60 * 60 * 24 * 3)))  # 區域搜尋紀錄的有效秒數
+NEARBY_LOCAL_MIN_RESULTS = int(os.getenv('NEARBY_LOCAL_MIN_RESULTS', '10'))  # 本地結果少於此數量時改呼叫 Google
+NEARBY_CACHE_TTL = int(os.getenv('NEARBY_CACHE_TTL', '600'))  # 格子搜尋結果保持新鮮的秒數
+NEARBY_CACHE_STALE_TTL = int(os.getenv('NEARBY_CACHE_STALE_TTL', '3600'))  # 過期後仍先返回舊結果並背景刷新的秒數
+NEARBY_CACHE_MAX_ENTRIES = int(os.getenv('NEARBY_CACHE_MAX_ENTRIES', '2000'))
+NEARBY_PAGE_TOKEN_DELAY = float(os.getenv('NEARBY_PAGE_TOKEN_DELAY', '2'))  # next_page_token 發出後到生效的等待秒數
+NEARBY_PAGE_TOKEN_RETRIES = int(os.getenv('NEARBY_PAGE_TOKEN_RETRIES', '3'))  # token 尚未生效時的重試次數
+NEARBY_PREFETCH_WORKERS = int(os.getenv('NEARBY_PREFETCH_WORKERS', '2'))  # 背景預取後續分頁的執行緒數
+
+# 地點詳情快取配置
+DETAILS_CACHE_TTL = int(os.getenv('DETAILS_CACHE_TTL', str(60 * 60 * 24 * 7)))  # 詳情保持新鮮的秒數
+DETAILS_CACHE_STALE_TTL = int(os.getenv('DETAILS_CACHE_STALE_TTL', str(60 * 60 * 24 * 23)))  # 過期後仍先返回舊資料並背景刷新的秒數
+DETAILS_FANOUT_WORKERS = int(os.getenv('DETAILS_FANOUT_WORKERS', '8'))  # 批次查詢時並行呼叫 Google 的執行緒數
+
+# 照片磁碟快取配置
+PHOTO_CACHE_DIR = os.getenv('PHOTO_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'cache', 'photos'))
+PHOTO_CACHE_MAX_BYTES = int(os.getenv('PHOTO_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))  # 快取總大小上限
+PHOTO_MEMORY_CACHE_MAX_BYTES = int(os.getenv('PHOTO_MEMORY_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))  # 記憶體熱門照片總大小上限
+PHOTO_MEMORY_CACHE_MAX_ITEM_BYTES = int(os.getenv('PHOTO_MEMORY_CACHE_MAX_ITEM_BYTES', str(1024 * 1024)))  # 超過此大小的照片不放入記憶體
+PHOTO_MEMORY_PROMOTE_HITS = int(os.getenv('PHOTO_MEMORY_PROMOTE_HITS', '2'))  # 磁碟命中幾次後載入記憶體
+PHOTO_WIDTH_BUCKETS = sorted(int(w) for w in os.getenv('PHOTO_WIDTH_BUCKETS', '200,400,800,1200,1600').split(','))  # 縮圖寬度級距，最大值即原圖寬度
+PHOTO_JPEG_QUALITY = int(os.getenv('PHOTO_JPEG_QUALITY', '85'))
+PHOTO_WEBP_QUALITY = int(os.getenv('PHOTO_WEBP_QUALITY', '80'))
+PHOTO_URI_CACHE_TTL = int(os.getenv('PHOTO_URI_CACHE_TTL', '3600'))  # Places API v1 photoUri 解析結果保存秒數
+PHOTO_URI_CACHE_MAX_ENTRIES = int(os.getenv('PHOTO_URI_CACHE_MAX_ENTRIES', '5000'))
+PHOTO_WARM_WORKERS = int(os.getenv('PHOTO_WARM_WORKERS', '4'))  # 背景預熱照片的執行緒數
+PHOTO_WARM_QUEUE_SIZE = int(os.getenv('PHOTO_WARM_QUEUE_SIZE', '500'))  # 等待預熱的照片上限，超過時丟棄
+PHOTO_WARM_WIDTH = int(os.getenv('PHOTO_WARM_WIDTH', '600'))  # 預熱的照片寬度（與卡片請求的寬度一致）
+
+# 背景工作配置
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', '4'))
+
+# 附近餐廳排序配置（各項分數介於 0 到 1，依權重加總後由高到低排序）
+RANKING_WEIGHT_RATING = float(os.getenv('RANKING_WEIGHT_RATING', '0.4'))  # 貝氏平滑後的評分
+RANKING_WEIGHT_POPULARITY = float(os.getenv('RANKING_WEIGHT_POPULARITY', '0.1'))  # 評論數（取對數）
+RANKING_WEIGHT_DISTANCE = float(os.getenv('RANKING_WEIGHT_DISTANCE', '0.35'))  # 距離越近越高
+RANKING_WEIGHT_AFFINITY = float(os.getenv('RANKING_WEIGHT_AFFINITY', '0.15'))  # 與用戶收藏類型的相似度
+RANKING_PRIOR_RATING = float(os.getenv('RANKING_PRIOR_RATING', '3.8'))  # 評論數少時評分向此值收斂
+RANKING_PRIOR_COUNT = float(os.getenv('RANKING_PRIOR_COUNT', '30'))  # 先驗評分相當於的評論數
+RANKING_PROFILE_TTL = int(os.getenv('RANKING_PROFILE_TTL', '600'))  # 用戶收藏類型分布在記憶體中保存的秒數
+RANKING_CANDIDATE_POOL = int(os.getenv('RANKING_CANDIDATE_POOL', '60'))  # 本地來源一次排序的候選餐廳數（距離最近的 N 間），各頁由排序結果切出
+
+# 滑動事件紀錄配置
+SWIPE_EVENT_QUEUE_SIZE = int(os.getenv('SWIPE_EVENT_QUEUE_SIZE', '10000'))  # 等待寫入的事件上限，超過時丟棄
+SWIPE_EVENT_BATCH_SIZE = int(os.getenv('SWIPE_EVENT_BATCH_SIZE', '500'))  # 每次 INSERT 最多寫入的事件數
+SWIPE_EVENT_FLUSH_INTERVAL = float(os.getenv('SWIPE_EVENT_FLUSH_INTERVAL', '2'))  # 未滿一批時最多等待的秒數
 
 # 其他配置
 DEBUG = os.getenv('DEBUG', 'False').lower() in ('true', '1', 't')
@@ -1,8 +1,8 @@
 from flask import Blueprint, request, jsonify
 from app.utils.auth import hash_password, verify_password, generate_token, login_required
-from app.utils.db import execute_query
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+from app.utils.db import execute_query, db_session
+from mysql.connector import IntegrityError, errorcode
+from app.utils.google_certs import google_verifier
 from app.config import GOOGLE_CLIENT_ID
 
 auth_bp = Blueprint('auth', __name__)
@@ -13,33 +13,25 @@ def register():
     if not data or not all(k in data for k in ('name', 'email', 'password')):
         return jsonify({"error": "Missing required fields"}), 400
     
-    # 檢查郵件是否已存在
-    existing_user = execute_query(
-        "SELECT id FROM users WHERE email = %s",
-        (data['email'],),
-        fetch_one=True
-    )
-    
-    if existing_user:
-        return jsonify({"error": "Email already registered"}), 409
-        
-    # 創建新用戶
+    # 直接寫入，依靠 email 唯一鍵判斷是否已註冊
     hashed_password = hash_password(data['password'])
     query = """
         INSERT INTO users (name, email, password)
         VALUES (%s, %s, %s)
     """
-    execute_query(query, (data['name'], data['email'], hashed_password), commit=True)
+    try:
+        with db_session() as session:
+            session.execute(query, (data['name'], data['email'], hashed_password))
+            user_id = session.lastrowid
+    except IntegrityError as e:
+        if e.errno == errorcode.ER_DUP_ENTRY:
+            return jsonify({"error": "Email already registered"}), 409
+        raise
     
-    # 獲取新用戶信息
-    user = execute_query(
-        "SELECT id, name, email FROM users WHERE email = %s",
-        (data['email'],),
-        fetch_one=True
-    )
+    user = {"id": user_id, "name": data['name'], "email": data['email']}
     
     # 生成 token
-    token = generate_token(user['id'])
+    token = generate_token(user['id'], user['name'], user['email'])
     
     return jsonify({
         "message": "User registered successfully",
@@ -64,7 +56,7 @@ def login():
         return jsonify({"error": "Invalid email or password"}), 401
     
     # 生成 token
-    token = generate_token(user['id'])
+    token = generate_token(user['id'], user['name'], user['email'])
     
     # 移除密碼欄位
     user.pop('password', None)
@@ -82,38 +74,38 @@ def google_login():
         return jsonify({"error": "Missing token"}), 400
     
     try:
-        # 驗證 Google token
-        idinfo = id_token.verify_oauth2_token(
-            token, google_requests.Request(), GOOGLE_CLIENT_ID)
+        # 驗證 Google token（含簽發者檢查），簽章憑證保存在記憶體中，不需每次下載
+        idinfo = google_verifier.verify(token, GOOGLE_CLIENT_ID)
         
-        if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
-            return jsonify({"error": "Wrong issuer"}), 401
-        
-        # 檢查用戶是否已存在
+        # 檢查用戶是否已存在，不存在則在同一個交易中建立
         email = idinfo['email']
-        user = execute_query(
-            "SELECT id, name, email FROM users WHERE email = %s",
-            (email,),
-            fetch_one=True
-        )
-        
-        if not user:
-            # 創建新用戶
-            query = """
-                INSERT INTO users (name, email)
-                VALUES (%s, %s)
-            """
-            execute_query(query, (idinfo['name'], email), commit=True)
-            
-            # 獲取新用戶信息
-            user = execute_query(
+        with db_session() as session:
+            user = session.execute(
                 "SELECT id, name, email FROM users WHERE email = %s",
                 (email,),
                 fetch_one=True
             )
+            
+            if not user:
+                # 並發登入時另一個請求可能已建立用戶，LAST_INSERT_ID(id) 讓 lastrowid 指向既有記錄
+                query = """
+                    INSERT INTO users (name, email)
+                    VALUES (%s, %s)
+                    ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+                """
+                inserted = session.execute(query, (idinfo['name'], email))
+                
+                if inserted == 1:
+                    user = {"id": session.lastrowid, "name": idinfo['name'], "email": email}
+                else:
+                    user = session.execute(
+                        "SELECT id, name, email FROM users WHERE id = %s",
+                        (session.lastrowid,),
+                        fetch_one=True
+                    )
         
         # 生成 token
-        token = generate_token(user['id'])
+        token = generate_token(user['id'], user['name'], user['email'])
         
         return jsonify({
             "message": "Google login successful",
@@ -0,0 +1,80 @@
+from flask import Blueprint, request, jsonify
+from datetime import datetime, timezone
+from app.utils.auth import get_optional_user
+from app.utils.event_log import swipe_event_log, SWIPE_ACTIONS
+
+events_bp = Blueprint('events', __name__)
+
+BATCH_MAX_EVENTS = 200  # 每次請求最多的事件數
+
+# swipe_events 欄位可以保存的範圍：INT 與 MySQL TIMESTAMP（UTC）
+MAX_INT = 2 ** 31 - 1
+MIN_TIMESTAMP = datetime(1970, 1, 1, 0, 0, 1)
+MAX_TIMESTAMP = datetime(2038, 1, 19, 3, 14, 7)
+
+def parse_timestamp(value):
+    """
+    將客戶端的毫秒時間戳轉為 UTC 時間，未提供時使用伺服器時間
+
+    超出 TIMESTAMP 欄位範圍時拋出 ValueError
+    """
+    if value is None:
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+    if isinstance(value, bool):
+        raise ValueError(value)
+    occurred_at = datetime.fromtimestamp(float(value) / 1000, timezone.utc).replace(tzinfo=None)
+    if not MIN_TIMESTAMP <= occurred_at <= MAX_TIMESTAMP:
+        raise ValueError(value)
+    return occurred_at
+
+def parse_int(value, minimum):
+    """將事件欄位轉為整數，超出 INT 欄位範圍時拋出 ValueError"""
+    if isinstance(value, bool):
+        raise ValueError(value)
+    number = int(value)
+    if not minimum <= number <= MAX_INT:
+        raise ValueError(value)
+    return number
+
+@events_bp.route('/swipes', methods=['POST'])
+def record_swipes():
+    """
+    記錄滑動事件，登入與否皆可使用
+
+    請求格式：{"events": [{"restaurant_id": 1, "action": "like", "position": 0, "timestamp": 1700000000000}]}
+    - action: like、dislike、skip 或 view
+    - position: 卡片在牌組中的位置（選填）
+    - timestamp: 事件發生的毫秒時間戳（選填，預設為伺服器收到的時間）
+
+    事件只放入記憶體佇列，由背景執行緒批次寫入 swipe_events 表，立即返回 202
+    """
+    data = request.json
+    events = data.get('events') if isinstance(data, dict) else None
+    if not isinstance(events, list) or not events:
+        return jsonify({"error": "Missing events"}), 400
+
+    if len(events) > BATCH_MAX_EVENTS:
+        return jsonify({"error": f"At most {BATCH_MAX_EVENTS} events per request"}), 400
+
+    user = get_optional_user()
+    user_id = user['id'] if user else None
+
+    rows = []
+    try:
+        for event in events:
+            action = event['action']
+            if action not in SWIPE_ACTIONS:
+                raise ValueError(action)
+            position = event.get('position')
+            rows.append((
+                user_id,
+                parse_int(event['restaurant_id'], 1),
+                action,
+                parse_int(position, 0) if position is not None else None,
+                parse_timestamp(event.get('timestamp'))
+            ))
+    except (TypeError, ValueError, KeyError, OverflowError, OSError):
+        return jsonify({"error": "Invalid event"}), 400
+
+    accepted = swipe_event_log.record(rows)
+    return jsonify({"accepted": accepted, "dropped": len(rows) - accepted}), 202
@@ -1,43 +1,117 @@
 from flask import Blueprint, request, jsonify
+import math
 import random
 from app.utils.auth import login_required
-from app.utils.db import execute_query
+from app.utils.db import execute_query, db_session
+from app.utils.etag import make_etag, is_not_modified, not_modified
+from app.utils.cursor import encode_cursor, decode_cursor
+from app.utils.favorite_ids import favorite_ids
+from app.utils.ranking import invalidate_type_profile
+from app.utils import geo
+from app.utils.categories import category_place_type
 
 favorites_bp = Blueprint('favorites', __name__)
 
+FAVORITES_PAGE_SIZE = 50  # 收藏列表每頁預設筆數
+FAVORITES_MAX_PAGE_SIZE = 100
+BATCH_MAX_OPERATIONS = 200  # 批次新增/移除收藏每次最多的操作數
+
+# 隨機收藏的加權方式：評分越高、收藏越新越容易被選中（權重必須為正數）
+RANDOM_WEIGHT_EXPRESSIONS = {
+    "rating": "GREATEST(COALESCE(r.rating, 3), 0.1)",
+    "recency": "(1 / (1 + DATEDIFF(NOW(), f.created_at) / 30))"
+}
+
 @favorites_bp.route('', methods=['GET'])
 @login_required
 def get_favorites(user):
-    """獲取用戶收藏的餐廳列表"""
+    """
+    獲取用戶收藏的餐廳列表（由新到舊）
+
+    以 (created_at, id) 做 keyset 分頁：每次最多返回 limit 筆，
+    還有下一頁時回應標頭 X-Next-Cursor 帶游標，以 ?cursor=<游標> 取得下一頁；
+    第一頁（沒有 cursor）的回應標頭 X-Total-Count 為收藏總數。回應本體維持餐廳陣列
+    """
+    limit = min(max(request.args.get('limit', FAVORITES_PAGE_SIZE, type=int), 1), FAVORITES_MAX_PAGE_SIZE)
+    cursor_param = request.args.get('cursor')
+    cursor = None
+    if cursor_param:
+        try:
+            cursor = decode_cursor(cursor_param, ("created_at", "id"))
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+    
     try:
-        # 聯合查詢用戶收藏的餐廳資訊
-        query = """
+        # 聯合查詢一頁收藏的餐廳資訊，沿 idx_favorites_user_created 索引由游標位置往後讀取，
+        # 多取一筆用於判斷是否還有下一頁；每頁的成本與收藏總數、頁數深度無關
+        conditions = "f.user_id = %s"
+        params = [user['id']]
+        if cursor:
+            conditions += " AND (f.created_at < %s OR (f.created_at = %s AND f.id < %s))"
+            params.extend([cursor['created_at'], cursor['created_at'], cursor['id']])
+        
+        query = f"""
             SELECT r.id, r.place_id, r.name, r.address, r.rating, r.user_ratings_total, 
-                   r.photo_reference, f.id as favorite_id
-            FROM restaurants r
-            JOIN favorites f ON r.id = f.restaurant_id
-            WHERE f.user_id = %s
-            ORDER BY f.created_at DESC
+                   r.photo_reference, r.updated_at, f.id AS favorite_id, f.created_at AS favorited_at
+            FROM favorites f
+            JOIN restaurants r ON r.id = f.restaurant_id
+            WHERE {conditions}
+            ORDER BY f.created_at DESC, f.id DESC
+            LIMIT %s
         """
+        params.append(limit + 1)
         
-        favorites = execute_query(query, (user['id'],), fetch_all=True)
+        favorites = execute_query(query, tuple(params), fetch_all=True)
+        if favorites is None:
+            # execute_query 在資料庫錯誤時返回 None，不能當作沒有收藏
+            return jsonify({"error": "Failed to fetch favorites"}), 500
         
-        # 格式化返回資料
-        result = []
-        for fav in favorites:
-            result.append({
-                'id': fav['id'],
-                'place_id': fav['place_id'],
-                'name': fav['name'],
-                'address': fav['address'],
-                'rating': fav['rating'],
-                'user_ratings_total': fav['user_ratings_total'],
-                'photo_reference': fav['photo_reference'],
-                'is_favorite': True,
-                'favorite_id': fav['favorite_id']
+        # 收藏總數只在第一頁計算一次，之後的頁面沿用；
+        # COUNT(*) 只讀 idx_favorites_user_created 索引中該用戶的範圍，不讀資料列
+        total = None
+        if not cursor:
+            count = execute_query(
+                "SELECT COUNT(*) AS count FROM favorites WHERE user_id = %s",
+                (user['id'],),
+                fetch_one=True
+            )
+            if count is None:
+                return jsonify({"error": "Failed to fetch favorites"}), 500
+            total = count['count']
+        
+        # 以本頁（含判斷下一頁的那一筆）的收藏 ID 與餐廳更新時間作為版本，
+        # 內容未變動時返回 304，不需序列化與傳送整頁結果
+        etag = make_etag(
+            "favorites", user['id'], limit, cursor_param, total,
+            *((fav['favorite_id'], fav['updated_at']) for fav in favorites)
+        )
+        if is_not_modified(etag):
+            return not_modified(etag, 'private, no-cache')
+        
+        has_more = len(favorites) > limit
+        favorites = favorites[:limit]
+        
+        next_cursor = None
+        if has_more:
+            last = favorites[-1]
+            next_cursor = encode_cursor({
+                "created_at": last['favorited_at'].strftime("%Y-%m-%d %H:%M:%S"),
+                "id": last['favorite_id']
             })
         
-        return jsonify(result), 200
+        for fav in favorites:
+            fav['is_favorite'] = True
+            del fav['favorited_at']
+            del fav['updated_at']
+        
+        response = jsonify(favorites)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        if total is not None:
+            response.headers['X-Total-Count'] = str(total)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response, 200
     
     except Exception as e:
         print(f"Error fetching favorites: {e}")
@@ -51,63 +125,144 @@ def add_favorite(user):
     if not data or 'restaurant_id' not in data:
         return jsonify({"error": "Missing restaurant_id"}), 400
     
-    restaurant_id = data['restaurant_id']
+    try:
+        restaurant_id = int(data['restaurant_id'])
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid restaurant_id"}), 400
     
     try:
-        # 檢查餐廳是否存在
-        restaurant = execute_query(
-            "SELECT id FROM restaurants WHERE id = %s",
-            (restaurant_id,),
-            fetch_one=True
-        )
+        with db_session() as session:
+            # 只在餐廳存在時寫入，已收藏則忽略
+            added = session.execute(
+                """
+                    INSERT IGNORE INTO favorites (user_id, restaurant_id)
+                    SELECT %s, id FROM restaurants WHERE id = %s
+                """,
+                (user['id'], restaurant_id)
+            )
+            
+            # 沒有寫入時，區分餐廳不存在與已經收藏
+            restaurant = None
+            if not added:
+                restaurant = session.execute(
+                    "SELECT id FROM restaurants WHERE id = %s",
+                    (restaurant_id,),
+                    fetch_one=True
+                )
+        
+        # 離開 with 區塊時才提交，提交成功後才更新收藏快取與偏好，避免提交失敗時快取與資料庫不一致
+        if added:
+            favorite_ids.mark(user['id'], [restaurant_id], True)
+            invalidate_type_profile(user['id'])
+            return jsonify({"message": "Restaurant added to favorites"}), 201
         
         if not restaurant:
             return jsonify({"error": "Restaurant not found"}), 404
         
-        # 檢查是否已經收藏
-        existing = execute_query(
-            "SELECT id FROM favorites WHERE user_id = %s AND restaurant_id = %s",
-            (user['id'], restaurant_id),
-            fetch_one=True
-        )
-        
-        if existing:
-            return jsonify({"message": "Restaurant already in favorites"}), 200
-        
-        # 新增收藏記錄
-        execute_query(
-            "INSERT INTO favorites (user_id, restaurant_id) VALUES (%s, %s)",
-            (user['id'], restaurant_id),
-            commit=True
-        )
-        
-        return jsonify({"message": "Restaurant added to favorites"}), 201
+        favorite_ids.mark(user['id'], [restaurant_id], True)
+        return jsonify({"message": "Restaurant already in favorites"}), 200
     
     except Exception as e:
         print(f"Error adding favorite: {e}")
         return jsonify({"error": "Failed to add favorite"}), 500
 
+def merge_operations(operations):
+    """
+    依序合併批次操作，同一間餐廳只保留最後一個動作
+
+    返回 (要新增的餐廳 ID 列表, 要移除的餐廳 ID 列表)，操作格式錯誤時拋出 ValueError
+    """
+    final_actions = {}
+    try:
+        for operation in operations:
+            action = operation['action']
+            if action not in ('add', 'remove'):
+                raise ValueError(action)
+            final_actions[int(operation['restaurant_id'])] = action
+    except (TypeError, KeyError) as e:
+        raise ValueError("Invalid operation") from e
+    
+    to_add = [restaurant_id for restaurant_id, action in final_actions.items() if action == 'add']
+    to_remove = [restaurant_id for restaurant_id, action in final_actions.items() if action == 'remove']
+    return to_add, to_remove
+
+@favorites_bp.route('/batch', methods=['POST'])
+@login_required
+def batch_update_favorites(user):
+    """
+    一次套用多個新增/移除收藏操作
+
+    請求格式：{"operations": [{"restaurant_id": 1, "action": "add"}, {"restaurant_id": 2, "action": "remove"}]}
+    同一間餐廳有多個操作時以最後一個為準（例如滑動時連續切換），
+    所有新增以一次多筆 INSERT IGNORE、所有移除以一次 DELETE ... IN 在同一個交易中完成
+    """
+    data = request.json
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list):
+        return jsonify({"error": "Missing operations"}), 400
+    
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return jsonify({"error": f"At most {BATCH_MAX_OPERATIONS} operations per request"}), 400
+    
+    try:
+        to_add, to_remove = merge_operations(operations)
+    except ValueError:
+        return jsonify({"error": "Invalid operation"}), 400
+    
+    try:
+        added = removed = 0
+        with db_session() as session:
+            if to_add:
+                # 只寫入存在的餐廳，已收藏的略過
+                placeholders = ", ".join(["%s"] * len(to_add))
+                added = session.execute(
+                    f"""
+                        INSERT IGNORE INTO favorites (user_id, restaurant_id)
+                        SELECT %s, id FROM restaurants WHERE id IN ({placeholders})
+                    """,
+                    (user['id'], *to_add)
+                )
+            if to_remove:
+                placeholders = ", ".join(["%s"] * len(to_remove))
+                removed = session.execute(
+                    f"DELETE FROM favorites WHERE user_id = %s AND restaurant_id IN ({placeholders})",
+                    (user['id'], *to_remove)
+                )
+        
+        # 不存在的餐廳不會出現在搜尋結果中，一併標記不影響收藏狀態的判斷
+        favorite_ids.mark(user['id'], to_add, True)
+        favorite_ids.mark(user['id'], to_remove, False)
+        if added or removed:
+            invalidate_type_profile(user['id'])
+        
+        return jsonify({
+            "message": "Favorites updated",
+            "added": added,
+            "removed": removed
+        }), 200
+    
+    except Exception as e:
+        print(f"Error updating favorites in batch: {e}")
+        return jsonify({"error": "Failed to update favorites"}), 500
+
 @favorites_bp.route('/<int:restaurant_id>', methods=['DELETE'])
 @login_required
 def remove_favorite(user, restaurant_id):
     """從收藏中移除餐廳"""
     try:
-        # 檢查是否已收藏
-        existing = execute_query(
-            "SELECT id FROM favorites WHERE user_id = %s AND restaurant_id = %s",
-            (user['id'], restaurant_id),
-            fetch_one=True
-        )
+        # 直接刪除收藏記錄，以影響行數判斷是否曾經收藏
+        with db_session() as session:
+            removed = session.execute(
+                "DELETE FROM favorites WHERE user_id = %s AND restaurant_id = %s",
+                (user['id'], restaurant_id)
+            )
+        
+        favorite_ids.mark(user['id'], [restaurant_id], False)
         
-        if not existing:
+        if not removed:
             return jsonify({"error": "Restaurant not in favorites"}), 404
         
-        # 刪除收藏記錄
-        execute_query(
-            "DELETE FROM favorites WHERE user_id = %s AND restaurant_id = %s",
-            (user['id'], restaurant_id),
-            commit=True
-        )
+        invalidate_type_profile(user['id'])
         
         return jsonify({"message": "Restaurant removed from favorites"}), 200
     
@@ -118,24 +273,96 @@ def remove_favorite(user, restaurant_id):
 @favorites_bp.route('/random', methods=['GET'])
 @login_required
 def get_random_favorite(user):
-    """隨機獲取一個收藏的餐廳"""
+    """
+    隨機獲取一個收藏的餐廳
+
+    篩選與抽選都在資料庫中進行，只傳回選中的一筆。可選參數：
+    - lat, lng, max_distance: 距離指定位置不超過 max_distance 公尺
+    - min_rating: 最低評分
+    - category: 前端類別（小吃、餐廳、甜點、咖啡）
+    - exclude_days: 排除最近 N 天內已被選中的收藏
+    - weight: rating 依評分加權，recency 依收藏時間加權（越新越容易選中）
+    """
     try:
-        # 獲取用戶所有收藏
-        query = """
+        conditions = ["f.user_id = %s"]
+        params = [user['id']]
+        
+        lat = request.args.get('lat', type=float)
+        lng = request.args.get('lng', type=float)
+        max_distance = request.args.get('max_distance', type=float)
+        if lat is not None and lng is not None and max_distance:
+            # 先以經緯度範圍縮小候選，再計算球面距離
+            d_lat = math.degrees(max_distance / geo.EARTH_RADIUS_M)
+            d_lng = d_lat / max(math.cos(math.radians(lat)), 0.01)
+            conditions.append("r.lat BETWEEN %s AND %s AND r.lng BETWEEN %s AND %s")
+            params.extend([lat - d_lat, lat + d_lat, lng - d_lng, lng + d_lng])
+            conditions.append("ST_Distance_Sphere(POINT(r.lng, r.lat), POINT(%s, %s)) <= %s")
+            params.extend([lng, lat, max_distance])
+        
+        min_rating = request.args.get('min_rating', type=float)
+        if min_rating is not None:
+            conditions.append("r.rating >= %s")
+            params.append(min_rating)
+        
+        place_type = category_place_type(request.args.get('category'))
+        if place_type:
+            conditions.append("FIND_IN_SET(%s, r.types)")
+            params.append(place_type)
+        
+        exclude_days = request.args.get('exclude_days', type=int)
+        if exclude_days:
+            conditions.append("(f.last_picked_at IS NULL OR f.last_picked_at < NOW() - INTERVAL %s DAY)")
+            params.append(exclude_days)
+        
+        weight = request.args.get('weight')
+        if weight and weight not in RANDOM_WEIGHT_EXPRESSIONS:
+            return jsonify({"error": "Invalid weight"}), 400
+        
+        where = " AND ".join(conditions)
+        select = f"""
             SELECT r.id, r.place_id, r.name, r.address, r.rating, r.user_ratings_total, 
-                   r.photo_reference
-            FROM restaurants r
-            JOIN favorites f ON r.id = f.restaurant_id
-            WHERE f.user_id = %s
+                   r.photo_reference, f.id AS favorite_id
+            FROM favorites f
+            JOIN restaurants r ON r.id = f.restaurant_id
+            WHERE {where}
         """
         
-        favorites = execute_query(query, (user['id'],), fetch_all=True)
+        if weight:
+            # 加權隨機抽樣（Efraimidis-Spirakis）：取 -LN(RAND()) / 權重 最小的一筆
+            random_favorite = execute_query(
+                f"{select} ORDER BY -LN(1 - RAND()) / {RANDOM_WEIGHT_EXPRESSIONS[weight]} LIMIT 1",
+                tuple(params),
+                fetch_one=True
+            )
+        else:
+            # 先計算符合條件的數量，再以隨機位移只取一筆
+            random_favorite = None
+            for _ in range(2):
+                count = execute_query(
+                    f"SELECT COUNT(*) AS count FROM favorites f JOIN restaurants r ON r.id = f.restaurant_id WHERE {where}",
+                    tuple(params),
+                    fetch_one=True
+                )
+                if not count or not count['count']:
+                    break
+                random_favorite = execute_query(
+                    f"{select} ORDER BY f.id LIMIT 1 OFFSET %s",
+                    (*params, random.randrange(count['count'])),
+                    fetch_one=True
+                )
+                # 計數後收藏被刪除時位移可能超出範圍，重新計數一次
+                if random_favorite:
+                    break
         
-        if not favorites:
+        if not random_favorite:
             return jsonify({"error": "No favorites found"}), 404
         
-        # 隨機選擇一個
-        random_favorite = random.choice(favorites)
+        # 記錄選中時間，供 exclude_days 排除最近選過的收藏
+        execute_query(
+            "UPDATE favorites SET last_picked_at = NOW() WHERE id = %s",
+            (random_favorite['favorite_id'],),
+            commit=True
+        )
         
         # 返回隨機選擇的餐廳
         result = {
@@ -153,4 +380,4 @@ def get_random_favorite(user):
     
     except Exception as e:
         print(f"Error getting random favorite: {e}")
-        return jsonify({"error": "Failed to get random favorite"}), 500 
\ No newline at end of file
+        return jsonify({"error": "Failed to get random favorite"}), 500
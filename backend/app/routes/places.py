@@ -1,16 +1,17 @@
 from flask import Blueprint, request, jsonify, Response
-import requests
 import traceback
-import os
-import hashlib
 from app.config import GOOGLE_MAPS_API_KEY
+from app.utils.http import google_get, google_post, GoogleAPIError, stream_upstream, passthrough_headers
+from app.utils.place_details import get_details
+from app.utils.photos import bucket_width, negotiate_format, photo_response, v1_photo_response
+from app.utils.etag import make_etag, is_not_modified, not_modified
 
 places_bp = Blueprint('places', __name__)
 
-# 建立快取目錄
-CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache')
-if not os.path.exists(CACHE_DIR):
-    os.makedirs(CACHE_DIR)
+# /details 端點返回的 Place Details 欄位
+PLACE_DETAIL_FIELDS = [
+    "name", "formatted_address", "photos", "rating", "user_ratings_total", "formatted_phone_number"
+]
 
 @places_bp.route('/v1-photo', methods=['GET'])
 def get_v1_photo():
@@ -23,61 +24,23 @@ def get_v1_photo():
         if not place_id or not photo_reference:
             return jsonify({"error": "地點ID和照片參考ID都是必需的"}), 400
         
-        # 構建 v1 格式的資源名稱
-        resource_name = f"places/{place_id}/photos/{photo_reference}/media"
-        
-        # 使用新版 Places API 獲取照片
-        photo_url = f"https://places.googleapis.com/v1/{resource_name}"
-        params = {
-            "maxWidthPx": max_width,
-            "key": GOOGLE_MAPS_API_KEY
-        }
-        
-        # 打印請求信息
-        print(f"請求 v1 格式照片: {photo_url}")
-        print(f"參數: {params}")
-        
-        headers = {
-            "X-Goog-Api-Key": GOOGLE_MAPS_API_KEY,
-            "Content-Type": "application/json"
-        }
-        
-        # 首先獲取照片 URI
-        response = requests.get(photo_url, params=params, headers=headers)
-        
-        # 打印響應信息
-        print(f"API響應狀態碼: {response.status_code}")
-        print(f"API響應頭: {response.headers}")
-        
-        if response.status_code != 200:
-            print(f"API錯誤響應: {response.text}")
-            return jsonify({"error": f"無法獲取照片URI: {response.status_code}"}), response.status_code
-        
-        # 解析JSON響應獲取照片URI
-        data = response.json()
-        print(f"API響應資料: {data}")
-        
-        if "photoUri" not in data:
-            return jsonify({"error": "回應中沒有photoUri"}), 500
-        
-        # 獲取照片URI
-        photo_uri = data["photoUri"]
-        print(f"照片URI: {photo_uri}")
-        
-        # 獲取實際照片
-        photo_response = requests.get(photo_uri, stream=True)
-        
-        if photo_response.status_code != 200:
-            return jsonify({"error": "無法獲取照片內容"}), photo_response.status_code
-        
-        # 將照片數據作為二進制內容返回
-        return Response(
-            photo_response.content,
-            content_type=photo_response.headers.get('content-type', 'image/jpeg'),
-            headers={
-                'Cache-Control': 'public, max-age=86400'  # 快取 24 小時
-            }
-        )
+        # 寬度取整到固定級距；同一照片與級距的內容不會改變，重新驗證時直接返回 304
+        width = bucket_width(max_width)
+        etag = make_etag("v1-photo", place_id, photo_reference, width)
+        if is_not_modified(etag):
+            return not_modified(etag, 'public, max-age=604800')
+        
+        # 照片與解析出的 photoUri 都有快取，重複瀏覽不需要呼叫 Google；
+        # 未命中時邊下載邊轉發並寫入快取
+        try:
+            photo = v1_photo_response(place_id, photo_reference, width, etag)
+        except GoogleAPIError as e:
+            print(f"獲取 v1 格式照片失敗: {e}")
+            return jsonify({"error": str(e)}), 502
+        
+        if photo is None:
+            return jsonify({"error": "無法獲取照片內容"}), 500
+        return photo
     
     except Exception as e:
         error_traceback = traceback.format_exc()
@@ -122,7 +85,8 @@ def text_search():
         print(f"字段遮罩：{field_mask}")
         
         # 使用新版 Places API
-        response = requests.post(
+        response = google_post(
+            "text_search",
             'https://places.googleapis.com/v1/places:searchText',
             json={
                 'textQuery': text_query,
@@ -171,34 +135,15 @@ def get_place_details():
         # 打印請求信息
         print(f"獲取地點詳情，place_id: {place_id}")
         
-        # 構建 API 請求
-        url = "https://maps.googleapis.com/maps/api/place/details/json"
-        params = {
-            "placeid": place_id,
-            "key": GOOGLE_MAPS_API_KEY,
-            "fields": "name,formatted_address,photos,rating,user_ratings_total,formatted_phone_number"
-        }
-        
-        # 發送請求
-        response = requests.get(url, params=params)
-        
-        # 打印響應信息
-        print(f"API響應狀態碼: {response.status_code}")
-        
-        if response.status_code != 200:
-            print(f"API錯誤響應: {response.text}")
-            return jsonify({"error": f"無法獲取地點詳情: {response.status_code}"}), response.status_code
-        
-        # 解析JSON響應
-        data = response.json()
-        
-        if data.get("status") != "OK":
-            error_message = data.get("error_message", "未知錯誤")
-            print(f"API錯誤: {error_message}")
-            return jsonify({"error": f"Google API錯誤: {error_message}"}), 400
+        # 優先使用本地快取，必要時才呼叫 Google
+        try:
+            result = get_details(place_id, PLACE_DETAIL_FIELDS)
+        except GoogleAPIError as e:
+            print(f"API錯誤: {e}")
+            return jsonify({"error": f"Google API錯誤: {e}"}), 400
         
         # 返回結果
-        return jsonify(data.get("result", {}))
+        return jsonify(result)
     
     except Exception as e:
         error_traceback = traceback.format_exc()
@@ -216,6 +161,11 @@ def get_photo():
         if not photo_reference:
             return jsonify({"error": "照片參考ID是必需的"}), 400
         
+        # 同一照片與寬度的內容不會改變，重新驗證時直接返回 304，不呼叫 Google 也不讀取磁碟
+        etag = make_etag("photo", photo_reference, max_width)
+        if is_not_modified(etag):
+            return not_modified(etag, 'public, max-age=86400')
+        
         # 直接從 Google Place Photos API 獲取照片
         photo_url = "https://maps.googleapis.com/maps/api/place/photo"
         params = {
@@ -224,19 +174,25 @@ def get_photo():
             "key": GOOGLE_MAPS_API_KEY
         }
         
-        response = requests.get(photo_url, params=params, stream=True)
+        response = google_get("photo", photo_url, params=params, stream=True)
         
         if response.status_code != 200:
+            response.close()
             return jsonify({"error": "無法獲取照片"}), response.status_code
         
-        # 將照片數據作為二進制內容返回
-        return Response(
-            response.content,
+        # 將照片數據逐塊串流返回
+        photo = Response(
+            stream_upstream(response),
             content_type=response.headers.get('content-type', 'image/jpeg'),
             headers={
-                'Cache-Control': 'public, max-age=86400'  # 快取 24 小時
+                'Cache-Control': 'public, max-age=86400',  # 快取 24 小時
+                **passthrough_headers(response)
             }
         )
+        # 串流未開始就結束時（例如 HEAD 請求）也要釋放上游連線
+        photo.call_on_close(response.close)
+        photo.set_etag(etag)
+        return photo
     
     except Exception as e:
         print(f"獲取照片時出錯: {e}")
@@ -244,7 +200,12 @@ def get_photo():
 
 @places_bp.route('/cached-photo', methods=['GET'])
 def get_cached_photo():
-    """帶快取的照片獲取接口"""
+    """
+    帶快取的照片獲取接口
+
+    寬度取整到固定級距，由快取的原圖縮放產生並快取；
+    請求的 Accept 包含 image/webp 時返回 WebP
+    """
     try:
         photo_reference = request.args.get('photoReference')
         max_width = request.args.get('maxwidth', 400, type=int)
@@ -252,52 +213,26 @@ def get_cached_photo():
         if not photo_reference:
             return jsonify({"error": "照片參考ID是必需的"}), 400
         
-        # 為照片創建一個緩存鍵
-        cache_key = hashlib.md5(f"{photo_reference}_{max_width}".encode()).hexdigest()
-        cache_path = os.path.join(CACHE_DIR, f"{cache_key}.jpg")
-        
-        # 檢查緩存
-        if os.path.exists(cache_path):
-            print(f"從快取提供照片: {cache_key}")
-            with open(cache_path, 'rb') as f:
-                cached_image = f.read()
-            
-            return Response(
-                cached_image,
-                content_type='image/jpeg',
-                headers={
-                    'Cache-Control': 'public, max-age=604800'  # 快取 7 天
-                }
-            )
-        
-        # 如果沒有快取，從 Google Place Photos API 獲取
-        photo_url = "https://maps.googleapis.com/maps/api/place/photo"
-        params = {
-            "maxwidth": max_width,
-            "photoreference": photo_reference,
-            "key": GOOGLE_MAPS_API_KEY
-        }
-        
-        response = requests.get(photo_url, params=params, stream=True)
-        
-        if response.status_code != 200:
-            return jsonify({"error": "無法獲取照片"}), response.status_code
-        
-        # 儲存到快取
-        with open(cache_path, 'wb') as f:
-            f.write(response.content)
-        
-        print(f"已快取照片: {cache_key}")
-        
-        # 將照片數據作為二進制內容返回
-        return Response(
-            response.content,
-            content_type=response.headers.get('content-type', 'image/jpeg'),
-            headers={
-                'Cache-Control': 'public, max-age=86400'  # 快取 24 小時
-            }
-        )
+        width = bucket_width(max_width)
+        fmt = negotiate_format()
+        
+        # 同一照片、級距與格式的內容不會改變，重新驗證時直接返回 304，不呼叫 Google 也不讀取磁碟
+        etag = make_etag("photo", photo_reference, width, fmt)
+        if is_not_modified(etag):
+            response = not_modified(etag, 'public, max-age=604800')
+            response.vary.add('Accept')
+            return response
+        
+        try:
+            photo = photo_response(photo_reference, width, fmt, etag)
+        except GoogleAPIError as e:
+            print(f"獲取照片失敗: {e}")
+            return jsonify({"error": "無法獲取照片"}), 502
+        
+        if photo is None:
+            return jsonify({"error": "無法獲取照片"}), 500
+        return photo
     
     except Exception as e:
         print(f"獲取照片時出錯: {e}")
-        return jsonify({"error": "獲取照片失敗"}), 500 
\ No newline at end of file
+        return jsonify({"error": "獲取照片失敗"}), 500
@@ -1,188 +1,583 @@
 from flask import Blueprint, request, jsonify
-import requests
 import json
+import time
 import random
+import threading
 import traceback
-from app.utils.auth import login_required
-from app.utils.db import execute_query, get_db_connection
-from app.config import GOOGLE_MAPS_API_KEY
+from app.utils.auth import login_required, get_optional_user
+from app.utils.db import execute_query
+from app.utils import geo
+from app.utils.http import google_get, GoogleAPIError
+from app.utils.cache import TTLCache
+from app.utils.background import BackgroundPool
+from app.utils.place_details import get_details, get_details_many
+from app.utils.singleflight import SingleFlight
+from app.utils.etag import make_etag, is_not_modified, not_modified
+from app.utils.cursor import encode_cursor, decode_cursor
+from app.utils.photos import bucket_width, negotiate_format, photo_response
+from app.utils.photo_warmer import photo_warmer
+from app.utils.favorite_ids import favorite_ids
+from app.utils.ranking import rank_restaurants, get_type_profile
+from app.utils.categories import category_place_type
+from app.config import (
+    GOOGLE_MAPS_API_KEY, NEARBY_SEARCH_MODE, NEARBY_COVERAGE_TTL, NEARBY_LOCAL_MIN_RESULTS,
+    NEARBY_CACHE_TTL, NEARBY_CACHE_STALE_TTL, NEARBY_CACHE_MAX_ENTRIES,
+    NEARBY_PAGE_TOKEN_DELAY, NEARBY_PAGE_TOKEN_RETRIES, NEARBY_PREFETCH_WORKERS, RANKING_CANDIDATE_POOL
+)
 
 restaurants_bp = Blueprint('restaurants', __name__)
 
-@restaurants_bp.route('/nearby', methods=['GET'])
-# 暫時移除login_required以便測試
-# @login_required
-def nearby_restaurants():  # 移除user參數
-    # 獲取請求參數
-    lat = request.args.get('lat', type=float)
-    lng = request.args.get('lng', type=float)
-    category = request.args.get('category', '全部')
-    radius = request.args.get('radius', 1000, type=int)  # 默認 1000 米內
-    
-    if not lat or not lng:
-        return jsonify({"error": "Missing location parameters"}), 400
-    
-    # 打印接收到的參數，用於調試
-    print(f"接收到附近餐廳請求，參數: lat={lat}, lng={lng}, category={category}, radius={radius}")
-    
-    # 根據類別設置對應的 Google Place Type
-    place_type = "restaurant"
-    if category != "全部":
-        type_mapping = {
-            "小吃": "food",
-            "餐廳": "restaurant",
-            "甜點": "bakery",
-            "咖啡": "cafe"
+# 餐廳詳情頁需要的 Place Details 欄位
+RESTAURANT_DETAIL_FIELDS = [
+    "formatted_address", "formatted_phone_number", "opening_hours",
+    "website", "url", "reviews", "photos"
+]
+
+BATCH_MAX_IDS = 50  # 批次獲取餐廳詳情時每次最多的餐廳數
+
+NEARBY_PAGE_SIZE = 20
+NEARBY_MAX_PAGES = 3  # Google Nearby Search 最多提供 3 頁結果；本地來源的頁數由候選池大小決定
+
+# 以 geohash 格子與頁碼為單位快取附近餐廳搜尋結果
+nearby_cache = TTLCache(
+    ttl=NEARBY_CACHE_TTL,
+    stale_ttl=NEARBY_CACHE_STALE_TTL,
+    max_entries=NEARBY_CACHE_MAX_ENTRIES
+)
+
+# 合併相同分頁的並發載入（用戶請求與背景預取共用）
+nearby_flight = SingleFlight("nearby")
+
+# 預取後續分頁需要等待 next_page_token 生效（time.sleep），
+# 使用獨立的執行緒池，不佔用快取刷新等共用背景工作的執行緒
+prefetch_pool = BackgroundPool(NEARBY_PREFETCH_WORKERS, "nearby-prefetch")
+
+# 已排入背景預取的分頁快取鍵
+_prefetching = set()
+_prefetching_lock = threading.Lock()
+
+def save_places(places):
+    """
+    將 Google Places 搜尋結果批次寫入 restaurants 表
+    
+    使用單一多列 INSERT ... ON DUPLICATE KEY UPDATE（以 place_id 為唯一鍵）
+    更新評分與照片，再以一次 SELECT ... IN 取回資料庫 ID
+    
+    返回:
+    - {place_id: restaurant_id} 字典，寫入失敗的餐廳不會出現在字典中
+    """
+    rows = {}
+    for place in places:
+        # 確保 geometry 和 location 存在
+        location = place.get("geometry", {}).get("location")
+        if location:
+            lat_val = location.get("lat", 0)
+            lng_val = location.get("lng", 0)
+        else:
+            print(f"警告: 餐廳 {place.get('name')} 缺少地理位置資訊")
+            lat_val = 0
+            lng_val = 0
+        
+        photo_reference = None
+        if place.get("photos"):
+            photo_reference = place["photos"][0]["photo_reference"]
+        
+        rows[place["place_id"]] = (
+            place["place_id"],
+            place["name"],
+            place.get("vicinity", ""),
+            lat_val,
+            lng_val,
+            place.get("rating", 0),
+            place.get("user_ratings_total", 0),
+            photo_reference,
+            ",".join(place.get("types", []))[:255],
+            geo.encode(lat_val, lng_val)
+        )
+    
+    if not rows:
+        return {}
+    
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(rows))
+    upsert_query = f"""
+        INSERT INTO restaurants (
+            place_id, name, address, lat, lng, rating, user_ratings_total, photo_reference,
+            types, geohash
+        ) VALUES {placeholders}
+        ON DUPLICATE KEY UPDATE
+            rating = VALUES(rating),
+            user_ratings_total = VALUES(user_ratings_total),
+            photo_reference = COALESCE(VALUES(photo_reference), photo_reference),
+            types = VALUES(types),
+            geohash = VALUES(geohash)
+    """
+    params = tuple(value for row in rows.values() for value in row)
+    execute_query(upsert_query, params, commit=True)
+    
+    in_placeholders = ", ".join(["%s"] * len(rows))
+    db_restaurants = execute_query(
+        f"SELECT id, place_id FROM restaurants WHERE place_id IN ({in_placeholders})",
+        tuple(rows.keys()),
+        fetch_all=True
+    )
+    
+    if not db_restaurants:
+        print("無法獲取餐廳的資料庫 ID，使用有限資訊返回")
+        return {}
+    
+    return {row["place_id"]: row["id"] for row in db_restaurants}
+
+def record_coverage(lat, lng, radius, place_type, result_count):
+    """
+    記錄此位置所在的 geohash 格子剛向 Google 搜尋過
+
+    格子已有更大半徑且仍在有效期內的紀錄時保留該紀錄，
+    避免較小半徑的搜尋縮小覆蓋範圍，讓之後較大半徑的查詢又呼叫 Google
+    """
+    cell = geo.encode(lat, lng, geo.cell_precision(radius))
+    # MySQL 依序套用各欄位的更新，radius 必須最先更新：
+    # 不保留舊紀錄時 radius 先變為新值，之後兩個欄位的條件也隨之不成立
+    keep_existing = "(VALUES(radius) < radius AND searched_at >= NOW() - INTERVAL %s SECOND)"
+    execute_query(
+        f"""
+            INSERT INTO nearby_coverage (geohash, place_type, radius, result_count)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                radius = IF({keep_existing}, radius, VALUES(radius)),
+                result_count = IF({keep_existing}, result_count, VALUES(result_count)),
+                searched_at = IF({keep_existing}, searched_at, CURRENT_TIMESTAMP)
+        """,
+        (cell, place_type, radius, result_count, *([NEARBY_COVERAGE_TTL] * 3)),
+        commit=True
+    )
+
+def get_fresh_coverage(lat, lng, radius, place_type):
+    """
+    返回此位置所在格子在 NEARBY_COVERAGE_TTL 內向 Google 搜尋到的餐廳數量，
+    沒有搜尋紀錄或已過期時返回 None
+    """
+    cell = geo.encode(lat, lng, geo.cell_precision(radius))
+    coverage = execute_query(
+        """
+            SELECT result_count FROM nearby_coverage
+            WHERE geohash = %s AND place_type = %s AND radius >= %s
+              AND searched_at >= NOW() - INTERVAL %s SECOND
+        """,
+        (cell, place_type, radius, NEARBY_COVERAGE_TTL),
+        fetch_one=True
+    )
+    
+    if not coverage:
+        return None
+    return coverage["result_count"]
+
+def query_local_restaurants(lat, lng, radius, place_type, limit):
+    """
+    從本地 restaurants 表依距離由近到遠查詢附近餐廳
+    
+    返回餐廳列表，資料庫錯誤時返回 None
+    """
+    # 以中心格子加上周圍 8 格的 geohash 前綴走索引，再以球面距離精確過濾
+    prefixes = geo.neighbors(geo.encode(lat, lng, geo.search_precision(radius)))
+    conditions = " OR ".join(["geohash LIKE %s"] * len(prefixes))
+    query = f"""
+        SELECT id, place_id, name, address, lat, lng, types, rating, user_ratings_total, photo_reference,
+               ST_Distance_Sphere(POINT(lng, lat), POINT(%s, %s)) AS distance
+        FROM restaurants
+        WHERE ({conditions}) AND FIND_IN_SET(%s, types)
+        HAVING distance <= %s
+        ORDER BY distance
+        LIMIT %s
+    """
+    params = (lng, lat, *[f"{prefix}%" for prefix in prefixes], place_type, radius, limit)
+    rows = execute_query(query, params, fetch_all=True)
+    
+    if rows is None:
+        return None
+    
+    restaurants = []
+    for row in rows:
+        restaurant = {
+            "id": row["id"],
+            "place_id": row["place_id"],
+            "name": row["name"],
+            "address": row["address"] or "",
+            "lat": row["lat"],
+            "lng": row["lng"],
+            "types": row["types"].split(",") if row["types"] else [],
+            "rating": row["rating"] or 0,
+            "user_ratings_total": row["user_ratings_total"] or 0,
+            "is_favorite": False
+        }
+        
+        if row["photo_reference"]:
+            restaurant["photo_reference"] = row["photo_reference"]
+        
+        restaurants.append(restaurant)
+    
+    return restaurants
+
+def search_local_restaurants(lat, lng, radius, place_type):
+    """
+    從本地 restaurants 表查詢距離最近的 RANKING_CANDIDATE_POOL 間餐廳作為候選池
+    
+    只有當此位置所在格子最近已向 Google 搜尋過，且本地結果數量足夠時才返回列表；
+    否則返回 None，由呼叫端改向 Google 搜尋
+    """
+    result_count = get_fresh_coverage(lat, lng, radius, place_type)
+    if result_count is None:
+        return None
+    
+    restaurants = query_local_restaurants(lat, lng, radius, place_type, RANKING_CANDIDATE_POOL)
+    if restaurants is None:
+        return None
+    
+    # Google 在此區域本來就只有少量結果時，不要求本地結果超過該數量
+    if len(restaurants) < min(NEARBY_LOCAL_MIN_RESULTS, result_count):
+        return None
+    
+    return restaurants
+
+def build_restaurants(places, restaurant_ids):
+    """將 Google 搜尋結果轉為返回給前端的餐廳資料"""
+    restaurants = []
+    for place in places:
+        # 由於移除了用戶驗證，設置默認值
+        is_favorite = False
+        
+        # 構建餐廳資料
+        location = place.get("geometry", {}).get("location") or {}
+        restaurant = {
+            "id": restaurant_ids.get(place["place_id"]),
+            "place_id": place["place_id"],
+            "name": place["name"],
+            "address": place.get("vicinity", ""),
+            "lat": location.get("lat"),
+            "lng": location.get("lng"),
+            "types": place.get("types", []),
+            "rating": place.get("rating", 0),
+            "user_ratings_total": place.get("user_ratings_total", 0),
+            "is_favorite": is_favorite
         }
-        place_type = type_mapping.get(category, "restaurant")
+        
+        # 如果有照片，添加照片引用
+        if place.get("photos"):
+            restaurant["photo_reference"] = place["photos"][0]["photo_reference"]
+        
+        restaurants.append(restaurant)
+    
+    return restaurants
+
+def fetch_google_page(lat, lng, radius, place_type, page_token=None, token_issued_at=None):
+    """
+    呼叫 Google Nearby Search 取得一頁結果，並批次寫入資料庫
+    
+    page_token 為上一頁返回的 next_page_token；Google 發出 token 後需等待
+    約 2 秒才會生效，因此會先等到 token_issued_at + NEARBY_PAGE_TOKEN_DELAY，
+    仍返回 INVALID_REQUEST 時再稍候重試
     
-    # 調用 Google Places API
+    Google 返回非 OK 狀態時拋出 GoogleAPIError
+    """
     places_url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-    params = {
-        "location": f"{lat},{lng}",
-        "radius": radius,
-        "type": place_type,
-        "language": "zh-TW",
-        "key": GOOGLE_MAPS_API_KEY
+    if page_token:
+        params = {
+            "pagetoken": page_token,
+            "key": GOOGLE_MAPS_API_KEY
+        }
+        delay = (token_issued_at or 0) + NEARBY_PAGE_TOKEN_DELAY - time.time()
+        if delay > 0:
+            time.sleep(delay)
+    else:
+        params = {
+            "location": f"{lat},{lng}",
+            "radius": radius,
+            "type": place_type,
+            "language": "zh-TW",
+            "key": GOOGLE_MAPS_API_KEY
+        }
+    
+    # 打印請求資訊
+    print(f"發送請求到 Google Places API: {places_url}")
+    print(f"請求參數: {params}")
+    
+    for attempt in range(NEARBY_PAGE_TOKEN_RETRIES + 1):
+        response = google_get("nearby", places_url, params=params)
+        places_data = response.json()
+        
+        token_pending = page_token and places_data.get("status") == "INVALID_REQUEST"
+        if not token_pending or attempt == NEARBY_PAGE_TOKEN_RETRIES:
+            break
+        time.sleep(1)
+    
+    # 打印 API 回應的狀態
+    print(f"API 回應狀態: {places_data.get('status')}")
+    
+    if places_data.get("status") != "OK":
+        error_message = places_data.get("error_message", "No detailed error message")
+        raise GoogleAPIError(f"{places_data.get('status')} - {error_message}")
+    
+    places = places_data.get("results", [])[:NEARBY_PAGE_SIZE]
+    if not places:
+        print("API 回應中沒有餐廳結果")
+    
+    # 一次寫入所有餐廳並取回資料庫 ID；資料庫不可用時 ID 為 None
+    restaurant_ids = save_places(places)
+    if restaurant_ids and not page_token:
+        record_coverage(lat, lng, radius, place_type, len(places))
+    
+    next_page_token = places_data.get("next_page_token")
+    return {
+        "restaurants": build_restaurants(places, restaurant_ids),
+        "source": "google",
+        "next_page_token": next_page_token,
+        "token_issued_at": time.time() if next_page_token else None,
+        "has_more": bool(next_page_token)
+    }
+
+def local_pool_page(restaurants):
+    return {
+        "restaurants": restaurants,
+        "source": "local",
+        "next_page_token": None,
+        "token_issued_at": None,
+        "has_more": len(restaurants) > NEARBY_PAGE_SIZE
     }
+
+def fetch_nearby_page(cursor):
+    """
+    依游標載入一頁附近餐廳
+    
+    第一頁在 hybrid 模式下若此區域最近已搜尋過，直接從本地資料庫查詢，
+    否則呼叫 Google；之後的分頁沿用第一頁的來源
+    
+    本地來源返回的是整個候選池（距離最近的 RANKING_CANDIDATE_POOL 間），
+    由 nearby_restaurants 一次排序後切出游標指向的那一頁
+    """
+    lat, lng = geo.cell_center(cursor["tile"])
+    radius = cursor["radius"]
+    place_type = cursor["type"]
+    
+    if cursor["page"] == 0:
+        if cursor["mode"] == 'hybrid':
+            restaurants = search_local_restaurants(lat, lng, radius, place_type)
+            if restaurants is not None:
+                print(f"從本地資料庫提供 {len(restaurants)} 間附近餐廳")
+                return local_pool_page(restaurants)
+        return fetch_google_page(lat, lng, radius, place_type)
+    
+    if cursor["source"] == "local":
+        # 候選池已過期被淘汰時重新查詢；資料庫錯誤不當作沒有餐廳，避免快取空的候選池
+        restaurants = query_local_restaurants(lat, lng, radius, place_type, RANKING_CANDIDATE_POOL)
+        if restaurants is None:
+            raise RuntimeError("無法從本地資料庫查詢附近餐廳")
+        return local_pool_page(restaurants)
     
+    return fetch_google_page(
+        lat, lng, radius, place_type,
+        page_token=cursor["token"],
+        token_issued_at=cursor["issued_at"]
+    )
+
+def next_cursor(cursor, page):
+    """返回下一頁的游標，沒有下一頁時返回 None"""
+    if page["source"] == "local":
+        # 本地來源的各頁都由同一個候選池切出，候選池用完即沒有下一頁
+        if (cursor["page"] + 1) * NEARBY_PAGE_SIZE >= len(page["restaurants"]):
+            return None
+    elif not page["has_more"] or cursor["page"] + 1 >= NEARBY_MAX_PAGES:
+        return None
+    return dict(
+        cursor,
+        page=cursor["page"] + 1,
+        source=page["source"],
+        token=page["next_page_token"],
+        issued_at=page["token_issued_at"]
+    )
+
+NEARBY_CURSOR_FIELDS = ("tile", "radius", "type", "mode", "page", "source", "token", "issued_at")
+
+def decode_nearby_cursor(value):
+    """解碼附近餐廳游標字串，格式錯誤時拋出 ValueError"""
+    return decode_cursor(value, NEARBY_CURSOR_FIELDS)
+
+def page_cache_key(cursor):
+    # 第一頁的來源在載入時才決定（source 為 None），之後的分頁依來源分開快取，
+    # 避免 Google 與本地資料庫的分頁串在一起；本地來源的後續分頁共用同一個候選池
+    page = "pool" if cursor["source"] == "local" else cursor["page"]
+    return (cursor["tile"], cursor["radius"], cursor["type"], cursor["mode"], page, cursor["source"])
+
+def is_cacheable_page(page):
+    """
+    分頁中每間餐廳都已寫入資料庫（有 id）時才可快取
+
+    資料庫無法連線時 save_places 返回空的對照表，餐廳 id 為 None；
+    這樣的分頁不快取，讓下一次請求重新寫入資料庫，而不是讓無法收藏的餐廳留在快取中直到過期
+    """
+    return page is not None and all(restaurant["id"] is not None for restaurant in page["restaurants"])
+
+def load_nearby_page(cursor):
+    """載入分頁並寫入快取；相同分頁並發載入時只執行一次"""
+    key = page_cache_key(cursor)
+    
+    def load():
+        page = fetch_nearby_page(cursor)
+        if is_cacheable_page(page):
+            nearby_cache.set(key, page)
+            if page["source"] == "local" and cursor["source"] is None:
+                # 第一頁來自本地時，後續分頁直接沿用同一個候選池，不再查詢資料庫
+                nearby_cache.set(page_cache_key(dict(cursor, source="local")), page)
+        return page
+    
+    return nearby_flight.do(key, load)
+
+def warm_page_photos(page, depth=0):
+    """
+    在背景預熱一頁餐廳的照片，後續頁面（depth 越大）排在越後面
+    
+    本地來源的候選池要排序後才知道每頁的餐廳，由 nearby_restaurants 預熱
+    """
+    if page["source"] == "local":
+        return
+    photo_warmer.warm(
+        [restaurant.get("photo_reference") for restaurant in page["restaurants"]],
+        base_priority=depth * NEARBY_PAGE_SIZE
+    )
+
+def prefetch_next_page(cursor, page, depth=1):
+    """在背景預取下一頁，讓用戶滑到下一頁時可直接從記憶體返回"""
+    next_page_cursor = next_cursor(cursor, page)
+    if not next_page_cursor:
+        return
+    
+    key = page_cache_key(next_page_cursor)
+    with _prefetching_lock:
+        if key in _prefetching or nearby_cache.contains(key):
+            return
+        _prefetching.add(key)
+    prefetch_pool.submit(_prefetch_page, key, next_page_cursor, depth)
+
+def _prefetch_page(key, cursor, depth):
     try:
-        # 打印請求資訊
-        print(f"發送請求到 Google Places API: {places_url}")
-        print(f"請求參數: {params}")
+        page = load_nearby_page(cursor)
+    finally:
+        with _prefetching_lock:
+            _prefetching.discard(key)
+    
+    # 預取頁面的照片也一併預熱，並繼續預取再下一頁
+    warm_page_photos(page, depth)
+    prefetch_next_page(cursor, page, depth + 1)
+
+def get_nearby_page(cursor):
+    """
+    返回游標指向的一頁附近餐廳，並在背景預熱照片、預取下一頁
+    
+    此頁正在背景預取時會等待預取結果，而不重複呼叫 Google。
+    Google 的後續分頁只能以游標中的 next_page_token 載入，token 過期後無法重新取得，
+    因此過期的後續分頁不在背景刷新，直到快取淘汰後才以新的游標重新載入
+    """
+    key = page_cache_key(cursor)
+    refresh = cursor["page"] == 0 or cursor["source"] != "google"
+    page = nearby_cache.get_or_load(
+        key, lambda: load_nearby_page(cursor), refresh=refresh, cacheable=is_cacheable_page
+    )
+    warm_page_photos(page)
+    prefetch_next_page(cursor, page)
+    return page
+
+def with_favorite_flags(restaurants, user):
+    """
+    返回帶有用戶收藏狀態的餐廳列表副本（快取中的分頁為所有用戶共用，不直接修改）
+
+    未登入時 is_favorite 一律為 False
+    """
+    if not user:
+        return restaurants
+    favorite_set = favorite_ids.lookup(user["id"], [restaurant["id"] for restaurant in restaurants])
+    return [
+        dict(restaurant, is_favorite=restaurant["id"] in favorite_set)
+        for restaurant in restaurants
+    ]
+
+@restaurants_bp.route('/nearby', methods=['GET'])
+def nearby_restaurants():
+    """
+    獲取附近餐廳，登入與否皆可使用
+
+    帶有有效 token 時以一次查詢（或收藏狀態快取）填入每間餐廳的 is_favorite；
+    結果依評分、評論數、距離與用戶收藏偏好排序，並附上距離 distance（公尺）：
+    - 本地來源一次排序距離最近的 RANKING_CANDIDATE_POOL 間候選，各頁依序由排序結果切出
+    - Google 來源只在頁內排序，後續分頁要等 next_page_token 生效才能取得，不等待全部分頁載入後再排序
+    """
+    user = get_optional_user()
+    
+    # 有游標時直接載入游標指向的分頁
+    cursor_param = request.args.get('cursor')
+    if cursor_param:
+        try:
+            cursor = decode_nearby_cursor(cursor_param)
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+    else:
+        # 獲取請求參數
+        lat = request.args.get('lat', type=float)
+        lng = request.args.get('lng', type=float)
+        category = request.args.get('category', '全部')
+        radius = request.args.get('radius', 1000, type=int)  # 默認 1000 米內
         
-        response = requests.get(places_url, params=params)
-        places_data = response.json()
+        if not lat or not lng:
+            return jsonify({"error": "Missing location parameters"}), 400
         
-        # 打印 API 回應的狀態
-        print(f"API 回應狀態: {places_data.get('status')}")
+        # 打印接收到的參數，用於調試
+        print(f"接收到附近餐廳請求，參數: lat={lat}, lng={lng}, category={category}, radius={radius}")
         
-        if places_data.get("status") != "OK":
-            error_message = places_data.get("error_message", "No detailed error message")
-            print(f"Google API error: {places_data.get('status')} - {error_message}")
-            return jsonify({"error": f"Google API error: {places_data.get('status')} - {error_message}"}), 500
+        # 根據類別設置對應的 Google Place Type
+        place_type = category_place_type(category) or "restaurant"
         
-        # 檢查是否有結果
-        if not places_data.get("results"):
-            print("API 回應中沒有餐廳結果")
-            return jsonify([])  # 返回空數組
+        # 將位置對齊到 geohash 格子，同一格子內的用戶共用搜尋結果
+        cursor = {
+            "tile": geo.encode(lat, lng, geo.cell_precision(radius)),
+            "radius": radius,
+            "type": place_type,
+            "mode": request.args.get('mode', NEARBY_SEARCH_MODE),
+            "page": 0,
+            "source": None,
+            "token": None,
+            "issued_at": None,
+            # 搜尋位置只用於排序，不影響分頁快取鍵
+            "lat": lat,
+            "lng": lng
+        }
+    
+    try:
+        page = get_nearby_page(cursor)
         
-        # 處理結果，獲取詳細資訊
-        restaurants = []
+        # 舊游標沒有搜尋位置時以格子中心代替
+        if "lat" in cursor and "lng" in cursor:
+            origin_lat, origin_lng = cursor["lat"], cursor["lng"]
+        else:
+            origin_lat, origin_lng = geo.cell_center(cursor["tile"])
+        profile = get_type_profile(user["id"]) if user else None
+        restaurants = rank_restaurants(page["restaurants"], origin_lat, origin_lng, cursor["radius"], profile)
+        if page["source"] == "local":
+            # 整個候選池排序後切出這一頁，並預熱這一頁與下一頁的照片
+            start = cursor["page"] * NEARBY_PAGE_SIZE
+            photo_warmer.warm(
+                [restaurant.get("photo_reference") for restaurant in restaurants[start:start + 2 * NEARBY_PAGE_SIZE]]
+            )
+            restaurants = restaurants[start:start + NEARBY_PAGE_SIZE]
         
-        # 嘗試連接資料庫
-        connection = get_db_connection()
-        if not connection:
-            print("無法連接到資料庫，使用有限資訊返回")
-            # 如果無法連接資料庫，仍然返回基本的餐廳信息
-            for place in places_data.get("results", [])[:20]:
-                restaurant = {
-                    "id": None,  # 沒有資料庫 ID
-                    "place_id": place["place_id"],
-                    "name": place["name"],
-                    "address": place.get("vicinity", ""),
-                    "rating": place.get("rating", 0),
-                    "user_ratings_total": place.get("user_ratings_total", 0),
-                    "is_favorite": False
-                }
-                
-                if place.get("photos"):
-                    restaurant["photo_reference"] = place["photos"][0]["photo_reference"]
-                
-                restaurants.append(restaurant)
-            
-            return jsonify(restaurants)
+        response = jsonify(with_favorite_flags(restaurants, user))
         
-        # 如果可以連接資料庫，按原計劃處理
-        for place in places_data.get("results", [])[:20]:  # 限制返回 20 個結果
-            print(f"處理餐廳: {place.get('name')}")
-            
-            # 嘗試從資料庫查詢該餐廳
-            try:
-                db_restaurant = execute_query(
-                    "SELECT id, place_id FROM restaurants WHERE place_id = %s",
-                    (place["place_id"],),
-                    fetch_one=True
-                )
-                
-                restaurant_id = None
-                
-                # 如果資料庫中沒有該餐廳，則保存
-                if not db_restaurant:
-                    print(f"餐廳 {place.get('name')} 不在資料庫中，插入新記錄")
-                    photo_reference = None
-                    if place.get("photos"):
-                        photo_reference = place["photos"][0]["photo_reference"]
-                        
-                    insert_query = """
-                        INSERT INTO restaurants (
-                            place_id, name, address, lat, lng, rating, user_ratings_total, photo_reference
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    """
-                    
-                    # 確保 geometry 和 location 存在
-                    if "geometry" in place and "location" in place["geometry"]:
-                        lat_val = place["geometry"]["location"].get("lat", 0)
-                        lng_val = place["geometry"]["location"].get("lng", 0)
-                    else:
-                        print(f"警告: 餐廳 {place.get('name')} 缺少地理位置資訊")
-                        lat_val = 0
-                        lng_val = 0
-                    
-                    execute_query(
-                        insert_query,
-                        (
-                            place["place_id"],
-                            place["name"],
-                            place.get("vicinity", ""),
-                            lat_val,
-                            lng_val,
-                            place.get("rating", 0),
-                            place.get("user_ratings_total", 0),
-                            photo_reference
-                        ),
-                        commit=True
-                    )
-                    
-                    # 獲取剛插入的餐廳 ID
-                    db_restaurant = execute_query(
-                        "SELECT id, place_id FROM restaurants WHERE place_id = %s",
-                        (place["place_id"],),
-                        fetch_one=True
-                    )
-                
-                # 確保 db_restaurant 不是 None
-                if db_restaurant:
-                    restaurant_id = db_restaurant["id"]
-                else:
-                    print(f"警告: 無法獲取餐廳 {place.get('name')} 的資料庫 ID")
-                    restaurant_id = None
-                
-                # 由於移除了用戶驗證，設置默認值
-                is_favorite = False
-                
-                # 構建餐廳資料
-                restaurant = {
-                    "id": restaurant_id,
-                    "place_id": place["place_id"],
-                    "name": place["name"],
-                    "address": place.get("vicinity", ""),
-                    "rating": place.get("rating", 0),
-                    "user_ratings_total": place.get("user_ratings_total", 0),
-                    "is_favorite": is_favorite
-                }
-                
-                # 如果有照片，添加照片引用
-                if place.get("photos"):
-                    restaurant["photo_reference"] = place["photos"][0]["photo_reference"]
-                
-                restaurants.append(restaurant)
-            except Exception as db_error:
-                print(f"處理餐廳 {place.get('name')} 時發生資料庫錯誤: {db_error}")
-                # 跳過這個餐廳，繼續處理其他的
-                continue
+        # 下一頁的游標放在回應標頭，回應本體維持餐廳陣列
+        next_page_cursor = next_cursor(cursor, page)
+        if next_page_cursor:
+            response.headers["X-Next-Cursor"] = encode_cursor(next_page_cursor)
         
-        return jsonify(restaurants)
+        return response
+    
+    except GoogleAPIError as e:
+        print(f"Google API error: {e}")
+        return jsonify({"error": f"Google API error: {e}"}), 500
     
     except Exception as e:
         error_traceback = traceback.format_exc()
@@ -195,41 +590,142 @@ def get_photo(photo_reference):
     if not photo_reference:
         return jsonify({"error": "Photo reference is required"}), 400
     
-    max_width = request.args.get('maxwidth', 400, type=int)
+    # 寬度取整到固定級距，所有級距都由同一張快取的原圖縮放產生，
+    # 客戶端接受 WebP 時轉為 WebP
+    width = bucket_width(request.args.get('maxwidth', 400, type=int))
+    fmt = negotiate_format()
     
-    # 直接代理 Google Place Photos API
-    photo_url = "https://maps.googleapis.com/maps/api/place/photo"
-    params = {
-        "photoreference": photo_reference,
-        "maxwidth": max_width,
-        "key": GOOGLE_MAPS_API_KEY
+    # 同一照片、級距與格式的內容不會改變，瀏覽器重新驗證時直接返回 304
+    etag = make_etag("photo", photo_reference, width, fmt)
+    if is_not_modified(etag):
+        response = not_modified(etag, 'public, max-age=604800')
+        response.vary.add('Accept')
+        return response
+    
+    try:
+        photo = photo_response(photo_reference, width, fmt, etag)
+        if photo is None:
+            return jsonify({"error": "Failed to fetch photo"}), 500
+        return photo
+    
+    except GoogleAPIError as e:
+        print(f"Google API error: {e}")
+        return jsonify({"error": "Failed to fetch photo"}), 502
+    except Exception as e:
+        print(f"Error fetching photo: {e}")
+        return jsonify({"error": "Failed to fetch photo"}), 500
+
+def format_details(result):
+    """將 Place Details 結果整理為餐廳詳情頁使用的格式"""
+    details = {
+        "formatted_address": result.get("formatted_address", ""),
+        "formatted_phone_number": result.get("formatted_phone_number", ""),
+        "website": result.get("website", ""),
+        "url": result.get("url", ""),
     }
     
+    # 營業時間
+    if "opening_hours" in result:
+        details["opening_hours"] = {
+            "weekday_text": result["opening_hours"].get("weekday_text", [])
+        }
+    
+    # 評論
+    if "reviews" in result:
+        details["reviews"] = []
+        for review in result["reviews"][:5]:  # 限制 5 則評論
+            details["reviews"].append({
+                "author_name": review.get("author_name", ""),
+                "rating": review.get("rating", 0),
+                "relative_time_description": review.get("relative_time_description", ""),
+                "text": review.get("text", "")
+            })
+    
+    # 照片
+    if "photos" in result:
+        details["photos"] = []
+        for photo in result["photos"][:5]:  # 限制 5 張照片
+            details["photos"].append({
+                "photo_reference": photo.get("photo_reference", "")
+            })
+    
+    return details
+
+@restaurants_bp.route('/batch', methods=['POST'])
+@login_required
+def get_restaurants_batch(user):
+    """
+    一次獲取多間餐廳的詳情
+    
+    以兩次查詢載入餐廳與收藏狀態，缺少快取的 Place Details 以有上限的
+    執行緒池並行向 Google 取得；返回順序與請求的 ids 相同，不存在的 id 會略過
+    """
+    data = request.json
+    if not data or not isinstance(data.get('ids'), list):
+        return jsonify({"error": "Missing ids"}), 400
+    
+    try:
+        # 去除重複並保留順序
+        restaurant_ids = list(dict.fromkeys(int(i) for i in data['ids']))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid ids"}), 400
+    
+    if len(restaurant_ids) > BATCH_MAX_IDS:
+        return jsonify({"error": f"At most {BATCH_MAX_IDS} ids per request"}), 400
+    
+    if not restaurant_ids:
+        return jsonify([])
+    
     try:
-        response = requests.get(photo_url, params=params, stream=True)
+        placeholders = ", ".join(["%s"] * len(restaurant_ids))
+        rows = execute_query(
+            f"""
+                SELECT id, place_id, name, address, lat, lng, rating, user_ratings_total, photo_reference
+                FROM restaurants WHERE id IN ({placeholders})
+            """,
+            tuple(restaurant_ids),
+            fetch_all=True
+        )
+        if rows is None:
+            # execute_query 在資料庫錯誤時返回 None，不能當作所有 id 都不存在
+            return jsonify({"error": "Failed to fetch restaurants"}), 500
         
-        if response.status_code != 200:
-            return jsonify({"error": "Failed to fetch photo"}), response.status_code
+        favorite_set = favorite_ids.lookup(user["id"], restaurant_ids)
         
-        # 轉發原始 response
-        from flask import Response
-        return Response(
-            response.raw.read(),
-            content_type=response.headers['content-type'],
-            status=response.status_code
+        details = get_details_many(
+            [row["place_id"] for row in rows],
+            RESTAURANT_DETAIL_FIELDS,
+            language="zh-TW"
         )
+        
+        restaurants_by_id = {}
+        for row in rows:
+            row["is_favorite"] = row["id"] in favorite_set
+            # 無法獲取詳情的餐廳仍返回基本信息
+            result = details.get(row["place_id"])
+            if result is not None:
+                row["details"] = format_details(result)
+            restaurants_by_id[row["id"]] = row
+        
+        return jsonify([restaurants_by_id[i] for i in restaurant_ids if i in restaurants_by_id])
     
     except Exception as e:
-        print(f"Error fetching photo: {e}")
-        return jsonify({"error": "Failed to fetch photo"}), 500
+        print(f"Error fetching restaurants batch: {e}")
+        return jsonify({"error": "Failed to fetch restaurants"}), 500
 
 @restaurants_bp.route('/<int:restaurant_id>', methods=['GET'])
 @login_required
 def get_restaurant(user, restaurant_id):
-    # 從資料庫獲取餐廳基本資訊
+    # 從資料庫獲取餐廳基本資訊，連同版本資訊（餐廳更新時間與詳情快取時間）
     restaurant = execute_query(
-        "SELECT id, place_id, name, address, lat, lng, rating, user_ratings_total, photo_reference FROM restaurants WHERE id = %s",
-        (restaurant_id,),
+        """
+            SELECT r.id, r.place_id, r.name, r.address, r.lat, r.lng, r.rating, r.user_ratings_total,
+                   r.photo_reference, r.updated_at, d.fetched_at AS details_fetched_at
+            FROM restaurants r
+            LEFT JOIN place_details_cache d ON d.place_id = r.place_id AND d.language = %s
+            WHERE r.id = %s
+        """,
+        ("zh-TW", restaurant_id),
         fetch_one=True
     )
     
@@ -249,62 +745,32 @@ def get_restaurant(user, restaurant_id):
     
     restaurant["is_favorite"] = is_favorite
     
-    # 獲取餐廳詳情（從 Google Place API）
-    place_url = "https://maps.googleapis.com/maps/api/place/details/json"
-    params = {
-        "place_id": restaurant["place_id"],
-        "fields": "formatted_address,formatted_phone_number,opening_hours,website,url,reviews,photos",
-        "language": "zh-TW",
-        "key": GOOGLE_MAPS_API_KEY
-    }
+    # 內容只由餐廳資料、收藏狀態與詳情快取決定，版本未變時直接返回 304，不讀取詳情
+    etag = make_etag(
+        "restaurant", user["id"], restaurant_id, restaurant.pop("updated_at"),
+        is_favorite, restaurant.pop("details_fetched_at")
+    )
+    if is_not_modified(etag):
+        return not_modified(etag, 'private, no-cache')
     
+    # 獲取餐廳詳情（優先使用本地快取，必要時呼叫 Google Place API）
     try:
-        response = requests.get(place_url, params=params)
-        place_data = response.json()
-        
-        if place_data.get("status") != "OK":
+        try:
+            result = get_details(restaurant["place_id"], RESTAURANT_DETAIL_FIELDS, language="zh-TW")
+        except GoogleAPIError as e:
             # 如果無法獲取詳情，仍返回基本信息
+            print(f"Google API error: {e}")
             return jsonify(restaurant)
         
         # 添加詳細信息
-        result = place_data.get("result", {})
-        details = {
-            "formatted_address": result.get("formatted_address", ""),
-            "formatted_phone_number": result.get("formatted_phone_number", ""),
-            "website": result.get("website", ""),
-            "url": result.get("url", ""),
-        }
-        
-        # 營業時間
-        if "opening_hours" in result:
-            details["opening_hours"] = {
-                "weekday_text": result["opening_hours"].get("weekday_text", [])
-            }
-        
-        # 評論
-        if "reviews" in result:
-            details["reviews"] = []
-            for review in result["reviews"][:5]:  # 限制 5 則評論
-                details["reviews"].append({
-                    "author_name": review.get("author_name", ""),
-                    "rating": review.get("rating", 0),
-                    "relative_time_description": review.get("relative_time_description", ""),
-                    "text": review.get("text", "")
-                })
-        
-        # 照片
-        if "photos" in result:
-            details["photos"] = []
-            for photo in result["photos"][:5]:  # 限制 5 張照片
-                details["photos"].append({
-                    "photo_reference": photo.get("photo_reference", "")
-                })
-        
-        restaurant["details"] = details
+        restaurant["details"] = format_details(result)
         
-        return jsonify(restaurant)
+        response = jsonify(restaurant)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     
     except Exception as e:
         print(f"Error fetching restaurant details: {e}")
         # 如果獲取詳情失敗，仍返回基本信息
-        return jsonify(restaurant) 
\ No newline at end of file
+        return jsonify(restaurant)
\ No newline at end of file
@@ -3,8 +3,16 @@ import time
 import hashlib
 import functools
 from flask import request, jsonify, current_app
-from app.config import JWT_SECRET_KEY, JWT_ACCESS_TOKEN_EXPIRES
+from app.config import (
+    JWT_SECRET_KEY, JWT_ACCESS_TOKEN_EXPIRES, AUTH_USER_CACHE_TTL, AUTH_USER_CACHE_MAX_ENTRIES,
+    AUTH_TRUST_TOKEN_CLAIMS
+)
 from app.utils.db import execute_query
+from app.utils.cache import TTLCache
+
+# 登入檢查用的用戶快取（user_id -> 用戶資料），避免每個請求都查詢資料庫；
+# 目前沒有修改或刪除用戶的功能，新增修改用戶資料的端點時需同時刪除此快取的項目
+user_cache = TTLCache(ttl=AUTH_USER_CACHE_TTL, max_entries=AUTH_USER_CACHE_MAX_ENTRIES)
 
 def hash_password(password):
     """將密碼進行雜湊加密"""
@@ -14,13 +22,21 @@ def verify_password(hashed_password, password):
     """驗證密碼是否正確"""
     return hashed_password == hash_password(password)
 
-def generate_token(user_id):
-    """生成 JWT token"""
+def generate_token(user_id, name=None, email=None):
+    """
+    生成 JWT token
+
+    有提供姓名與 email 時一併簽入 token，
+    啟用 AUTH_TRUST_TOKEN_CLAIMS 時登入檢查可直接使用而不查詢資料庫
+    """
     payload = {
         'user_id': user_id,
         'exp': int(time.time()) + JWT_ACCESS_TOKEN_EXPIRES,
         'iat': int(time.time())
     }
+    if name is not None and email is not None:
+        payload['name'] = name
+        payload['email'] = email
     return jwt.encode(payload, JWT_SECRET_KEY, algorithm='HS256')
 
 def decode_token(token):
@@ -31,14 +47,18 @@ def decode_token(token):
         print(f"JWT decode error: {e}")
         return None
 
-def get_current_user():
-    """從請求中獲取當前用戶ID"""
+def get_token_payload():
+    """從請求中取得已驗證的 token 內容"""
     auth_header = request.headers.get('Authorization')
     if not auth_header or not auth_header.startswith('Bearer '):
         return None
 
     token = auth_header.split(' ')[1]
-    decoded_token = decode_token(token)
+    return decode_token(token)
+
+def get_current_user():
+    """從請求中獲取當前用戶ID"""
+    decoded_token = get_token_payload()
     
     if not decoded_token:
         return None
@@ -46,21 +66,45 @@ def get_current_user():
     user_id = decoded_token.get('user_id')
     return user_id
 
+def load_user(user_id):
+    """返回用戶資料，優先使用記憶體快取；用戶不存在時返回 None（不快取）"""
+    user = user_cache.get_or_load(user_id, lambda: execute_query(
+        "SELECT id, name, email FROM users WHERE id = %s", 
+        (user_id,), 
+        fetch_one=True
+    ))
+    # 返回副本，避免呼叫端修改到快取中的資料
+    return dict(user) if user else None
+
+def user_from_token(decoded_token):
+    """由已驗證的 token 內容取得用戶資料，用戶不存在時返回 None"""
+    user_id = decoded_token.get('user_id')
+    if not user_id:
+        return None
+    
+    if AUTH_TRUST_TOKEN_CLAIMS and 'name' in decoded_token and 'email' in decoded_token:
+        # token 由本服務簽發，直接使用其中的用戶資料
+        return {"id": user_id, "name": decoded_token['name'], "email": decoded_token['email']}
+    
+    # 檢查用戶是否存在
+    return load_user(user_id)
+
+def get_optional_user():
+    """請求帶有有效 token 時返回用戶資料，否則返回 None（用於登入與否皆可使用的端點）"""
+    decoded_token = get_token_payload()
+    if not decoded_token:
+        return None
+    return user_from_token(decoded_token)
+
 def login_required(f):
     """用戶登入檢查裝飾器"""
     @functools.wraps(f)
     def decorated(*args, **kwargs):
-        user_id = get_current_user()
-        if not user_id:
+        decoded_token = get_token_payload()
+        if not decoded_token or not decoded_token.get('user_id'):
             return jsonify({"error": "Unauthorized"}), 401
-            
-        # 檢查用戶是否存在
-        user = execute_query(
-            "SELECT id, name, email FROM users WHERE id = %s", 
-            (user_id,), 
-            fetch_one=True
-        )
         
+        user = user_from_token(decoded_token)
         if not user:
             return jsonify({"error": "User not found"}), 401
             
@@ -0,0 +1,28 @@
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from app.config import BACKGROUND_WORKERS
+
+def _run(fn, args, kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        print(f"背景工作 {getattr(fn, '__name__', fn)} 執行失敗: {e}")
+        print(f"詳細錯誤信息: {traceback.format_exc()}")
+        return None
+
+class BackgroundPool:
+    """固定執行緒數的背景工作池，例外只記錄不拋出"""
+
+    def __init__(self, workers, name):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+
+    def submit(self, fn, *args, **kwargs):
+        """在背景執行 fn，返回 Future"""
+        return self._executor.submit(_run, fn, args, kwargs)
+
+# 背景工作共用的執行緒池（快取刷新、預熱等不阻塞請求的短工作）
+_pool = BackgroundPool(BACKGROUND_WORKERS, "background")
+
+def submit(fn, *args, **kwargs):
+    """在共用背景執行緒池中執行 fn，例外只記錄不拋出，返回 Future"""
+    return _pool.submit(fn, *args, **kwargs)
@@ -0,0 +1,134 @@
+import time
+import threading
+from collections import OrderedDict
+from app.utils.background import submit
+
+class TTLCache:
+    """
+    有容量上限的記憶體 LRU 快取，支援 stale-while-revalidate
+
+    參數:
+    - ttl: 資料保持新鮮的秒數
+    - stale_ttl: 過期後仍可先返回舊資料、同時在背景刷新的秒數
+    - max_entries: 最多保存的項目數，超過時淘汰最久未使用的項目
+    """
+
+    def __init__(self, ttl, stale_ttl=0, max_entries=1000):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (value, stored_at)
+        self._refreshing = set()
+
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._refreshes = 0
+        self._evictions = 0
+
+    def _lookup(self, key):
+        """返回 (value, state)，state 為 fresh、stale 或 None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None, None
+
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age < self.ttl:
+                self._data.move_to_end(key)
+                return value, "fresh"
+            if age < self.ttl + self.stale_ttl:
+                self._data.move_to_end(key)
+                return value, "stale"
+
+            del self._data[key]
+            return None, None
+
+    def get(self, key):
+        """返回新鮮的快取值，沒有或已過期時返回 None"""
+        value, state = self._lookup(key)
+        with self._lock:
+            if state == "fresh":
+                self._hits += 1
+                return value
+            self._misses += 1
+        return None
+
+    def contains(self, key):
+        """是否有新鮮或仍可使用的舊資料（不計入統計）"""
+        value, state = self._lookup(key)
+        return state is not None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key, loader, refresh=True, cacheable=None):
+        """
+        返回快取值；未命中時同步呼叫 loader() 並快取其結果
+
+        資料已過期但仍在 stale_ttl 內時直接返回舊資料，
+        並在背景呼叫 loader() 刷新（同一個 key 同時只刷新一次）；
+        refresh 為 False 時只返回舊資料，不在背景刷新。
+        loader() 返回 None 或 cacheable(value) 為 False 時不快取（背景刷新時保留舊資料）
+        """
+        cacheable = cacheable or (lambda value: value is not None)
+        value, state = self._lookup(key)
+
+        if state == "fresh":
+            with self._lock:
+                self._hits += 1
+            return value
+
+        if state == "stale":
+            with self._lock:
+                self._stale_hits += 1
+                start_refresh = refresh and key not in self._refreshing
+                if start_refresh:
+                    self._refreshing.add(key)
+                    self._refreshes += 1
+            if start_refresh:
+                submit(self._refresh, key, loader, cacheable)
+            return value
+
+        with self._lock:
+            self._misses += 1
+        value = loader()
+        if cacheable(value):
+            self.set(key, value)
+        return value
+
+    def _refresh(self, key, loader, cacheable):
+        try:
+            value = loader()
+            if cacheable(value):
+                self.set(key, value)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def stats(self):
+        """返回命中率等統計資料"""
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "hits": self._hits,
+                "stale_hits": self._stale_hits,
+                "misses": self._misses,
+                "refreshes": self._refreshes,
+                "evictions": self._evictions
+            }
@@ -0,0 +1,13 @@
+# 前端類別對應的 Google Place Type
+CATEGORY_TYPES = {
+    "小吃": "food",
+    "餐廳": "restaurant",
+    "甜點": "bakery",
+    "咖啡": "cafe"
+}
+
+def category_place_type(category):
+    """返回前端類別對應的 Google Place Type，「全部」或未指定時返回 None"""
+    if not category or category == "全部":
+        return None
+    return CATEGORY_TYPES.get(category, "restaurant")
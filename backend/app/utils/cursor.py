@@ -0,0 +1,44 @@
+import hmac
+import json
+import base64
+import hashlib
+from app.config import SECRET_KEY
+
+SIGNATURE_BYTES = 16  # HMAC-SHA256 截斷後的簽章長度
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _b64decode(value):
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+def _sign(payload):
+    return hmac.new(SECRET_KEY.encode(), payload.encode(), hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+def encode_cursor(data):
+    """
+    將游標資料編碼為不透明字串
+
+    格式為 <base64 JSON>.<base64 簽章>，以 SECRET_KEY 簽章，客戶端無法修改游標內容
+    """
+    payload = _b64encode(json.dumps(data, separators=(",", ":")).encode())
+    return f"{payload}.{_b64encode(_sign(payload))}"
+
+def decode_cursor(value, required=()):
+    """解碼游標字串，簽章不符、格式錯誤或缺少必要欄位時拋出 ValueError"""
+    payload, _, signature = value.partition(".")
+    try:
+        valid = hmac.compare_digest(_b64decode(signature), _sign(payload))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not valid:
+        raise ValueError("Invalid cursor")
+
+    try:
+        data = json.loads(_b64decode(payload))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    if not isinstance(data, dict) or not all(k in data for k in required):
+        raise ValueError("Invalid cursor")
+    return data
@@ -1,14 +1,215 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
 import mysql.connector
 from mysql.connector import Error
-from app.config import MYSQL_CONFIG
+from mysql.connector.errors import OperationalError, InterfaceError
+from app.config import (
+    MYSQL_CONFIG, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    DB_POOL_HEALTH_CHECK_INTERVAL
+)
+
+class PoolTimeoutError(Error):
+    """在 checkout timeout 內無法從連線池取得連線"""
+    pass
+
+class PooledConnection:
+    """
+    連線池借出的連線包裝
+
+    除了 close() 會把連線歸還連線池而非真正關閉之外，
+    其餘屬性與方法皆直接轉發給底層的 MySQL 連線
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._broken = False
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def invalidate(self):
+        """標記連線已損壞，歸還時直接關閉而不放回連線池"""
+        self._broken = True
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._pool.release(self._raw, self._created_at, self._broken)
+
+class ConnectionPool:
+    """
+    有上限的 MySQL 連線池
+
+    參數:
+    - size: 最多同時存在的連線數
+    - timeout: 借用連線時最多等待的秒數
+    - recycle: 連線建立超過此秒數後，借用時會關閉並重建
+    - health_check_interval: 閒置超過此秒數的連線，借用前先 ping 確認仍可用
+    """
+
+    def __init__(self, config, size=10, timeout=5.0, recycle=3600, health_check_interval=30):
+        self.config = dict(config, autocommit=True)
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.health_check_interval = health_check_interval
+
+        self._lock = threading.Condition()
+        self._idle = deque()  # (raw, created_at, returned_at)
+        self._total = 0
+
+        # 統計資料
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._timeouts = 0
+        self._recycled = 0
+        self._health_check_failures = 0
+
+    def _connect(self):
+        return mysql.connector.connect(**self.config)
+
+    def _close_raw(self, raw):
+        try:
+            raw.close()
+        except Error:
+            pass
+
+    def acquire(self):
+        """借出一條連線，必要時等待其他請求歸還"""
+        deadline = None
+        waited = False
+        start = time.monotonic()
+
+        with self._lock:
+            while not self._idle and self._total >= self.size:
+                if deadline is None:
+                    deadline = start + self.timeout
+                    waited = True
+                    self._waits += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    self._record_wait(time.monotonic() - start)
+                    raise PoolTimeoutError(
+                        msg=f"Timed out after {self.timeout}s waiting for a database connection"
+                    )
+                self._lock.wait(remaining)
+
+            if waited:
+                self._record_wait(time.monotonic() - start)
+
+            self._checkouts += 1
+            if self._idle:
+                raw, created_at, returned_at = self._idle.pop()
+            else:
+                raw, created_at, returned_at = None, None, None
+                self._total += 1
+
+        # 建立或檢查連線時不持有鎖，避免阻塞其他請求
+        try:
+            now = time.monotonic()
+            if raw is not None and now - created_at > self.recycle:
+                self._close_raw(raw)
+                raw = None
+                with self._lock:
+                    self._recycled += 1
+            elif raw is not None and now - returned_at > self.health_check_interval:
+                if not raw.is_connected():
+                    self._close_raw(raw)
+                    raw = None
+                    with self._lock:
+                        self._health_check_failures += 1
+
+            if raw is None:
+                raw = self._connect()
+                created_at = time.monotonic()
+        except Exception:
+            with self._lock:
+                self._total -= 1
+                self._lock.notify()
+            raise
+
+        return PooledConnection(self, raw, created_at)
+
+    def release(self, raw, created_at, broken=False):
+        """歸還連線；損壞或仍在交易中無法回滾的連線會直接關閉"""
+        if not broken:
+            try:
+                if raw.in_transaction:
+                    raw.rollback()
+            except Error:
+                broken = True
+
+        with self._lock:
+            if broken:
+                self._total -= 1
+            else:
+                self._idle.append((raw, created_at, time.monotonic()))
+            self._lock.notify()
+
+        if broken:
+            self._close_raw(raw)
+
+    def _record_wait(self, elapsed):
+        self._wait_time += elapsed
+        self._max_wait_time = max(self._max_wait_time, elapsed)
+
+    def stats(self):
+        """返回連線池使用狀況，用於調整連線池大小"""
+        with self._lock:
+            idle = len(self._idle)
+            return {
+                "size": self.size,
+                "open": self._total,
+                "in_use": self._total - idle,
+                "idle": idle,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_total": round(self._wait_time, 4),
+                "wait_time_max": round(self._max_wait_time, 4),
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+                "health_check_failures": self._health_check_failures
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """返回全域連線池，第一次使用時才建立"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    MYSQL_CONFIG,
+                    size=DB_POOL_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    recycle=DB_POOL_RECYCLE,
+                    health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL
+                )
+    return _pool
+
+def get_pool_stats():
+    """返回連線池統計資料"""
+    return get_pool().stats()
 
 def get_db_connection():
     """
-    創建並返回 MySQL 數據庫連接
+    從連線池借出並返回 MySQL 數據庫連接
+
+    使用完畢後呼叫 close() 即可歸還連線池
     """
     try:
-        connection = mysql.connector.connect(**MYSQL_CONFIG)
-        return connection
+        return get_pool().acquire()
     except Error as e:
         print(f"Error connecting to MySQL: {e}")
         return None
@@ -33,7 +234,8 @@ def execute_query(query, params=None, fetch_all=False, fetch_one=False, commit=F
     
     try:
         if connection:
-            cursor = connection.cursor(dictionary=True)
+            # 使用緩衝游標，避免未讀完的結果集留在歸還連線池的連線上
+            cursor = connection.cursor(dictionary=True, buffered=True)
             cursor.execute(query, params)
             
             if fetch_all:
@@ -46,8 +248,12 @@ def execute_query(query, params=None, fetch_all=False, fetch_one=False, commit=F
                 result = cursor.rowcount
     except Error as e:
         print(f"Error executing query: {e}")
-        if commit and connection:
-            connection.rollback()
+        if connection:
+            if isinstance(e, (OperationalError, InterfaceError)):
+                # 連線本身出錯，不再放回連線池
+                connection.invalidate()
+            elif commit:
+                connection.rollback()
     finally:
         if cursor:
             cursor.close()
@@ -56,6 +262,70 @@ def execute_query(query, params=None, fetch_all=False, fetch_one=False, commit=F
             
     return result
 
+class DBSession:
+    """
+    在同一條連線、同一個交易中執行多條 SQL 的工作單元
+
+    每次 execute() 後可從 lastrowid 與 rowcount 取得最後一條語句的結果
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.lastrowid = None
+        self.rowcount = 0
+
+    def execute(self, query, params=None, fetch_all=False, fetch_one=False):
+        """
+        執行 SQL 查詢
+
+        返回:
+        - fetch_all / fetch_one 時返回查詢結果，否則返回影響的行數
+        """
+        cursor = self.connection.cursor(dictionary=True, buffered=True)
+        try:
+            cursor.execute(query, params)
+
+            self.lastrowid = cursor.lastrowid
+            self.rowcount = cursor.rowcount
+
+            if fetch_all:
+                return cursor.fetchall()
+            if fetch_one:
+                return cursor.fetchone()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+@contextmanager
+def db_session():
+    """
+    借出一條連線並開啟交易，區塊正常結束時提交，發生例外時回滾
+
+    與 execute_query 不同，錯誤不會被吞掉而是向上拋出，
+    由呼叫端決定如何回應
+
+    用法:
+        with db_session() as session:
+            session.execute("INSERT ...", params)
+            new_id = session.lastrowid
+    """
+    connection = get_pool().acquire()
+    try:
+        connection.start_transaction()
+        yield DBSession(connection)
+        connection.commit()
+    except Exception as e:
+        if isinstance(e, (OperationalError, InterfaceError)):
+            connection.invalidate()
+        else:
+            try:
+                connection.rollback()
+            except Error:
+                connection.invalidate()
+        raise
+    finally:
+        connection.close()
+
 def create_tables():
     """
     創建初始數據表結構
@@ -86,8 +356,11 @@ def create_tables():
         photo_reference VARCHAR(255),
         cuisines VARCHAR(255),
         price_level INT,
+        types VARCHAR(255),
+        geohash CHAR(12),
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX idx_restaurants_geohash (geohash)
     );
     """
     
@@ -98,9 +371,50 @@ def create_tables():
         user_id INT,
         restaurant_id INT,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_picked_at TIMESTAMP NULL,
         FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
         FOREIGN KEY (restaurant_id) REFERENCES restaurants(id) ON DELETE CASCADE,
-        UNIQUE KEY user_restaurant (user_id, restaurant_id)
+        UNIQUE KEY user_restaurant (user_id, restaurant_id),
+        INDEX idx_favorites_user_created (user_id, created_at, id)
+    );
+    """
+    
+    # 附近搜尋覆蓋紀錄表（記錄哪些 geohash 格子最近已向 Google 搜尋過）
+    nearby_coverage_table = """
+    CREATE TABLE IF NOT EXISTS nearby_coverage (
+        geohash CHAR(12) NOT NULL,
+        place_type VARCHAR(32) NOT NULL,
+        radius INT NOT NULL,
+        result_count INT NOT NULL DEFAULT 0,
+        searched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (geohash, place_type)
+    );
+    """
+    
+    # 地點詳情快取表（Google Place Details 結果，依地點與語言保存）
+    place_details_cache_table = """
+    CREATE TABLE IF NOT EXISTS place_details_cache (
+        place_id VARCHAR(255) NOT NULL,
+        language VARCHAR(16) NOT NULL DEFAULT '',
+        fields VARCHAR(512) NOT NULL,
+        data MEDIUMTEXT CHARACTER SET utf8mb4 NOT NULL,
+        fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (place_id, language)
+    );
+    """
+    
+    # 滑動事件紀錄表（只新增不修改，不設外鍵以降低寫入成本）
+    swipe_events_table = """
+    CREATE TABLE IF NOT EXISTS swipe_events (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NULL,
+        restaurant_id INT NOT NULL,
+        action VARCHAR(16) NOT NULL,
+        deck_position INT NULL,
+        occurred_at TIMESTAMP(3) NOT NULL,
+        received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_swipe_events_user_time (user_id, occurred_at),
+        INDEX idx_swipe_events_restaurant (restaurant_id)
     );
     """
     
@@ -108,8 +422,76 @@ def create_tables():
     execute_query(users_table, commit=True)
     execute_query(restaurants_table, commit=True)
     execute_query(favorites_table, commit=True)
+    execute_query(nearby_coverage_table, commit=True)
+    execute_query(place_details_cache_table, commit=True)
+    execute_query(swipe_events_table, commit=True)
+    
+    migrate_tables()
+
+def column_exists(table, column):
+    """檢查目前資料庫中的表是否已有指定欄位"""
+    row = execute_query(
+        """
+            SELECT COUNT(*) AS count FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """,
+        (table, column),
+        fetch_one=True
+    )
+    return bool(row and row["count"])
+
+def index_exists(table, index):
+    """檢查目前資料庫中的表是否已有指定索引"""
+    row = execute_query(
+        """
+            SELECT COUNT(*) AS count FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        """,
+        (table, index),
+        fetch_one=True
+    )
+    return bool(row and row["count"])
+
+# 舊資料庫升級用的欄位與索引（table, 名稱, ALTER 語句）
+MIGRATION_COLUMNS = [
+    ("restaurants", "types", "ALTER TABLE restaurants ADD COLUMN types VARCHAR(255) AFTER price_level"),
+    ("restaurants", "geohash", "ALTER TABLE restaurants ADD COLUMN geohash CHAR(12) AFTER types"),
+    ("favorites", "last_picked_at", "ALTER TABLE favorites ADD COLUMN last_picked_at TIMESTAMP NULL AFTER created_at"),
+]
+
+MIGRATION_INDEXES = [
+    ("restaurants", "idx_restaurants_geohash", "ALTER TABLE restaurants ADD INDEX idx_restaurants_geohash (geohash)"),
+    ("favorites", "idx_favorites_user_created", "ALTER TABLE favorites ADD INDEX idx_favorites_user_created (user_id, created_at, id)"),
+]
+
+def migrate_tables():
+    """
+    為既有資料庫補上新欄位與索引，並回填舊資料
+    
+    可重複執行，已存在的欄位與索引會略過
+    """
+    for table, column, ddl in MIGRATION_COLUMNS:
+        if not column_exists(table, column):
+            print(f"新增欄位 {table}.{column}")
+            execute_query(ddl, commit=True)
+    
+    for table, index, ddl in MIGRATION_INDEXES:
+        if not index_exists(table, index):
+            print(f"新增索引 {table}.{index}")
+            execute_query(ddl, commit=True)
+    
+    # 回填舊餐廳的 geohash（MySQL 5.7+ 內建 ST_GeoHash）
+    updated = execute_query(
+        """
+            UPDATE restaurants SET geohash = ST_GeoHash(lng, lat, 12)
+            WHERE geohash IS NULL AND lat IS NOT NULL AND lng IS NOT NULL
+        """,
+        commit=True
+    )
+    if updated:
+        print(f"已回填 {updated} 間餐廳的 geohash")
 
 # 當模塊直接運行時初始化數據庫
 if __name__ == "__main__":
     create_tables()
-    print("Database tables created or already exist.") 
\ No newline at end of file
+    print("Database tables created or migrated.") 
\ No newline at end of file
@@ -0,0 +1,18 @@
+import hashlib
+from flask import request, Response
+
+def make_etag(*parts):
+    """以任意參數產生強 ETag 值（不含引號）"""
+    return hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+
+def is_not_modified(etag):
+    """請求的 If-None-Match 是否包含此 ETag"""
+    return etag in request.if_none_match
+
+def not_modified(etag, cache_control=None):
+    """返回不含本體的 304 回應"""
+    response = Response(status=304)
+    response.set_etag(etag)
+    if cache_control:
+        response.headers['Cache-Control'] = cache_control
+    return response
@@ -0,0 +1,202 @@
+import time
+import queue
+import atexit
+import threading
+from app.config import SWIPE_EVENT_QUEUE_SIZE, SWIPE_EVENT_BATCH_SIZE, SWIPE_EVENT_FLUSH_INTERVAL
+from mysql.connector import Error
+from mysql.connector.errors import OperationalError, InterfaceError
+from app.utils.db import db_session, PoolTimeoutError
+
+SWIPE_ACTIONS = ("like", "dislike", "skip", "view")
+
+# 資料庫無法連線（而非資料本身有問題）時的錯誤，整批放回佇列稍後重試
+CONNECTION_ERRORS = (OperationalError, InterfaceError, PoolTimeoutError)
+RETRY_BACKOFF_BASE = 1  # 資料庫無法連線時第一次重試前等待的秒數
+RETRY_BACKOFF_MAX = 30
+
+class SwipeEventLog:
+    """
+    滑動事件的非同步寫入器
+
+    - record() 只把事件放入記憶體佇列，不在請求中存取資料庫
+    - 背景執行緒累積到 batch_size 筆或等待 flush_interval 秒後，以一次多筆 INSERT 寫入；
+      資料錯誤時逐筆重試，資料庫無法連線時放回佇列並以指數退避等待後再寫入
+    - 佇列已滿時丟棄新事件並計數，事件紀錄不能拖慢滑動
+    - 程序結束時盡量寫入佇列中剩餘的事件
+    """
+
+    def __init__(self, max_queued, batch_size, flush_interval):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._lock = threading.Lock()
+        self._started = False
+
+        self._accepted = 0
+        self._dropped = 0
+        self._written = 0
+        self._failed = 0
+        self._flushes = 0
+        self._requeued = 0
+        self._retries = 0
+
+    def _start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, name="swipe-event-writer", daemon=True).start()
+        atexit.register(self.flush)
+
+    def record(self, events):
+        """將事件 (user_id, restaurant_id, action, deck_position, occurred_at) 放入佇列，返回接受的數量"""
+        self._start()
+        accepted = 0
+        for event in events:
+            try:
+                self._queue.put_nowait(event)
+                accepted += 1
+            except queue.Full:
+                break
+        with self._lock:
+            self._accepted += accepted
+            self._dropped += len(events) - accepted
+        return accepted
+
+    def _take_batch(self, timeout):
+        """等待第一筆事件，之後在 flush_interval 內盡量湊滿一批"""
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _insert(batch):
+        """
+        以一次多筆 INSERT 寫入事件，失敗時拋出 mysql.connector.Error
+
+        occurred_at 為不含時區的 UTC 時間，MySQL 以連線的時區解讀 TIMESTAMP 輸入，
+        因此寫入時將此連線的時區設為 UTC，寫入後還原，不影響之後借用同一條連線的查詢
+        """
+        placeholders = ", ".join(["(%s, %s, %s, %s, %s)"] * len(batch))
+        params = [value for event in batch for value in event]
+        with db_session() as session:
+            session.execute("SET time_zone = '+00:00'")
+            try:
+                session.execute(
+                    f"""
+                        INSERT INTO swipe_events (user_id, restaurant_id, action, deck_position, occurred_at)
+                        VALUES {placeholders}
+                    """,
+                    tuple(params)
+                )
+            finally:
+                session.execute("SET time_zone = @@GLOBAL.time_zone")
+
+    def _requeue(self, events):
+        """資料庫無法連線時將事件放回佇列，佇列已滿時丟棄並計數"""
+        requeued = 0
+        for event in events:
+            try:
+                self._queue.put_nowait(event)
+                requeued += 1
+            except queue.Full:
+                break
+        with self._lock:
+            self._requeued += requeued
+            self._dropped += len(events) - requeued
+
+    def _write(self, batch, requeue=True):
+        """
+        以一次多筆 INSERT 寫入一批事件，資料庫無法連線時返回 False
+
+        - 資料錯誤（例如某一筆超出欄位範圍）時改為逐筆寫入，只丟棄無法寫入的事件，
+          不讓一筆壞資料拖累同批其他用戶的事件
+        - 連線錯誤時不逐筆重試，將未寫入的事件放回佇列（requeue 為 False 時記為失敗）
+        """
+        written = failed = 0
+        unwritten = []
+        try:
+            self._insert(batch)
+            written = len(batch)
+        except CONNECTION_ERRORS as e:
+            print(f"寫入滑動事件時無法連線資料庫: {e}")
+            unwritten = batch
+        except Error as e:
+            print(f"批次寫入滑動事件失敗，改為逐筆寫入: {e}")
+            for index, event in enumerate(batch):
+                try:
+                    self._insert([event])
+                    written += 1
+                except CONNECTION_ERRORS as e:
+                    print(f"寫入滑動事件時無法連線資料庫: {e}")
+                    unwritten = batch[index:]
+                    break
+                except Error as e:
+                    print(f"丟棄無法寫入的滑動事件 {event}: {e}")
+                    failed += 1
+
+        if unwritten:
+            if requeue:
+                self._requeue(unwritten)
+            else:
+                failed += len(unwritten)
+        with self._lock:
+            self._flushes += 1
+            self._written += written
+            self._failed += failed
+        return not unwritten
+
+    def _run(self):
+        backoff = RETRY_BACKOFF_BASE
+        while True:
+            batch = self._take_batch(timeout=None)
+            if not batch:
+                continue
+            if self._write(batch):
+                backoff = RETRY_BACKOFF_BASE
+            else:
+                # 資料庫無法連線，等待後再重試，避免持續發出注定失敗的請求
+                with self._lock:
+                    self._retries += 1
+                time.sleep(backoff)
+                backoff = min(backoff * 2, RETRY_BACKOFF_MAX)
+
+    def flush(self):
+        """立即寫入佇列中的所有事件（程序結束時使用，無法連線時不再重試）"""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch, requeue=False)
+
+    def stats(self):
+        """返回事件寫入統計資料"""
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "accepted": self._accepted,
+                "dropped": self._dropped,
+                "written": self._written,
+                "failed": self._failed,
+                "flushes": self._flushes,
+                "requeued": self._requeued,
+                "retries": self._retries
+            }
+
+swipe_event_log = SwipeEventLog(SWIPE_EVENT_QUEUE_SIZE, SWIPE_EVENT_BATCH_SIZE, SWIPE_EVENT_FLUSH_INTERVAL)
@@ -0,0 +1,74 @@
+import threading
+from app.config import FAVORITE_IDS_CACHE_TTL, FAVORITE_IDS_CACHE_MAX_USERS, FAVORITE_IDS_MAX_PER_USER
+from app.utils.db import execute_query
+from app.utils.cache import TTLCache
+
+class FavoriteIdCache:
+    """
+    每位用戶已知的收藏狀態快取（user_id -> {restaurant_id: 是否收藏}）
+
+    - 查詢時只對尚未知道狀態的餐廳執行一次 IN 查詢，收藏與未收藏都會記下
+    - 新增或移除收藏時由 mark() 同步更新，不需等快取過期
+    - 單一用戶記錄超過 max_per_user 筆時清空重來，避免長時間瀏覽無限成長
+    """
+
+    def __init__(self, ttl, max_users, max_per_user):
+        self.max_per_user = max_per_user
+        self._users = TTLCache(ttl=ttl, max_entries=max_users)
+        self._lock = threading.Lock()
+
+    def _states(self, user_id):
+        states = self._users.get(user_id)
+        if states is None:
+            states = {}
+            self._users.set(user_id, states)
+        return states
+
+    def lookup(self, user_id, restaurant_ids):
+        """返回 restaurant_ids 中已被用戶收藏的餐廳 ID 集合"""
+        restaurant_ids = list(dict.fromkeys(restaurant_ids))
+        if not restaurant_ids:
+            return set()
+
+        with self._lock:
+            states = self._states(user_id)
+            missing = [restaurant_id for restaurant_id in restaurant_ids if restaurant_id not in states]
+
+        found = set()
+        if missing:
+            placeholders = ", ".join(["%s"] * len(missing))
+            rows = execute_query(
+                f"SELECT restaurant_id FROM favorites WHERE user_id = %s AND restaurant_id IN ({placeholders})",
+                (user_id, *missing),
+                fetch_all=True
+            )
+            if rows is None:
+                # 查詢失敗時不記錄狀態，本次視為未收藏
+                missing = []
+            else:
+                found = {row["restaurant_id"] for row in rows}
+
+        with self._lock:
+            states = self._states(user_id)
+            for restaurant_id in missing:
+                # 查詢期間收藏狀態已被 mark() 更新時以新的狀態為準
+                states.setdefault(restaurant_id, restaurant_id in found)
+            result = {restaurant_id for restaurant_id in restaurant_ids if states.get(restaurant_id)}
+            if len(states) > self.max_per_user:
+                states.clear()
+        return result
+
+    def mark(self, user_id, restaurant_ids, is_favorite):
+        """新增或移除收藏後更新快取"""
+        with self._lock:
+            states = self._states(user_id)
+            for restaurant_id in restaurant_ids:
+                states[restaurant_id] = is_favorite
+
+    def invalidate(self, user_id):
+        self._users.delete(user_id)
+
+    def stats(self):
+        return self._users.stats()
+
+favorite_ids = FavoriteIdCache(FAVORITE_IDS_CACHE_TTL, FAVORITE_IDS_CACHE_MAX_USERS, FAVORITE_IDS_MAX_PER_USER)
@@ -0,0 +1,123 @@
+import math
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_BASE32_INDEX = {c: i for i, c in enumerate(_BASE32)}
+
+EARTH_RADIUS_M = 6371000
+
+# 各精度 geohash 格子的大約尺寸（公尺，寬 x 高，赤道附近）
+_CELL_SIZES_M = {
+    1: (5009400, 4992600),
+    2: (1252300, 624100),
+    3: (156500, 156000),
+    4: (39100, 19500),
+    5: (4900, 4900),
+    6: (1200, 609.4),
+    7: (152.9, 152.4),
+    8: (38.2, 19),
+    9: (4.8, 4.8),
+}
+
+def encode(lat, lng, precision=12):
+    """將經緯度編碼為 geohash 字串"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+def decode_bbox(geohash):
+    """返回 geohash 格子的邊界 (min_lat, min_lng, max_lat, max_lng)"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+
+    for c in geohash:
+        index = _BASE32_INDEX[c]
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (index >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+def neighbors(geohash):
+    """返回 geohash 本身及周圍 8 個格子（不含超出南北極的格子）"""
+    min_lat, min_lng, max_lat, max_lng = decode_bbox(geohash)
+    center_lat = (min_lat + max_lat) / 2
+    center_lng = (min_lng + max_lng) / 2
+    d_lat = max_lat - min_lat
+    d_lng = max_lng - min_lng
+
+    cells = []
+    for i in (-1, 0, 1):
+        lat = center_lat + i * d_lat
+        if lat < -90 or lat > 90:
+            continue
+        for j in (-1, 0, 1):
+            lng = center_lng + j * d_lng
+            # 經度跨越 ±180 度時繞回
+            lng = (lng + 180) % 360 - 180
+            cell = encode(lat, lng, len(geohash))
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+def search_precision(radius):
+    """
+    返回以 9 宮格覆蓋指定半徑時使用的 geohash 精度
+
+    選擇格子寬高都不小於半徑的最高精度，
+    如此中心格子加上周圍 8 格一定包含整個搜尋圓
+    """
+    precision = 1
+    for p, (width, height) in sorted(_CELL_SIZES_M.items()):
+        if width >= radius and height >= radius:
+            precision = p
+    return precision
+
+def cell_precision(radius):
+    """返回格子寬高都不超過半徑一半的最低精度，用於以格子代表一次搜尋"""
+    for p, (width, height) in sorted(_CELL_SIZES_M.items()):
+        if width <= radius / 2 and height <= radius / 2:
+            return p
+    return max(_CELL_SIZES_M)
+
+def haversine(lat1, lng1, lat2, lng2):
+    """計算兩點間的球面距離（公尺）"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lng2 - lng1)
+
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+def cell_center(geohash):
+    """返回 geohash 格子的中心點 (lat, lng)"""
+    min_lat, min_lng, max_lat, max_lng = decode_bbox(geohash)
+    return (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
@@ -0,0 +1,134 @@
+import re
+import time
+import threading
+from google.auth import jwt as google_jwt
+from app.config import GOOGLE_CERTS_REFRESH_MARGIN, GOOGLE_CERTS_DEFAULT_TTL, GOOGLE_CERTS_MIN_FORCED_INTERVAL
+from app.utils.http import google_get
+from app.utils.background import submit
+
+# 與 google.oauth2.id_token.verify_oauth2_token 使用相同的憑證網址
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+class GoogleCertVerifier:
+    """
+    長期保存 Google 簽章憑證的 ID token 驗證器
+
+    - 憑證保存在記憶體中，依回應的 Cache-Control max-age（扣除 Age）決定有效期限
+    - 距離到期不到 refresh_margin 秒時先使用現有憑證，並在背景刷新
+    - 已過期或尚未載入時同步下載；透過共用連線池（google_get）下載，
+      並發請求合併為一次，也不需每次重新建立連線
+    - token 的 key id 不在現有憑證中時（Google 輪替金鑰）強制刷新一次再驗證；
+      距離上次下載或強制刷新不到 min_forced_interval 秒時不再下載，直接返回驗證錯誤，
+      避免偽造 key id 的 token 讓每個請求都向 Google 下載憑證
+    """
+
+    def __init__(self, refresh_margin, default_ttl, min_forced_interval):
+        self.refresh_margin = refresh_margin
+        self.default_ttl = default_ttl
+        self.min_forced_interval = min_forced_interval
+        self._lock = threading.Lock()
+        self._certs = None
+        self._expires_at = 0
+        self._refreshing = False
+        self._fetched_at = None
+        self._forced_at = None
+
+        self._fetches = 0
+        self._background_refreshes = 0
+        self._forced_refreshes = 0
+        self._skipped_forced_refreshes = 0
+
+    def _max_age(self, response):
+        match = _MAX_AGE_RE.search(response.headers.get("cache-control", ""))
+        if not match:
+            return self.default_ttl
+        try:
+            age = int(response.headers.get("age", 0))
+        except ValueError:
+            age = 0
+        return max(int(match.group(1)) - age, 0)
+
+    def _fetch(self):
+        response = google_get("google_certs", GOOGLE_CERTS_URL)
+        if response.status_code != 200:
+            raise ValueError(f"無法取得 Google 憑證: HTTP {response.status_code}")
+
+        certs = response.json()
+        with self._lock:
+            self._certs = certs
+            self._fetched_at = time.monotonic()
+            self._expires_at = self._fetched_at + self._max_age(response)
+            self._fetches += 1
+        return certs
+
+    def _refresh(self):
+        try:
+            self._fetch()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def get_certs(self, force=False):
+        """
+        返回目前有效的憑證 {key id: PEM 憑證}
+
+        force 為 True 時重新下載；距離上次下載或強制刷新不到 min_forced_interval 秒時忽略 force
+        """
+        now = time.monotonic()
+        with self._lock:
+            certs = self._certs
+            remaining = self._expires_at - now
+            if force and certs is not None:
+                # 已有憑證時 _fetched_at 必定有值；_forced_at 也計入，避免下載失敗時持續重試
+                last = max(self._fetched_at, self._forced_at or self._fetched_at)
+                if now - last < self.min_forced_interval:
+                    force = False
+                    self._skipped_forced_refreshes += 1
+                else:
+                    self._forced_at = now
+                    self._forced_refreshes += 1
+            start_refresh = (
+                not force and certs is not None and 0 < remaining < self.refresh_margin
+                and not self._refreshing
+            )
+            if start_refresh:
+                self._refreshing = True
+                self._background_refreshes += 1
+
+        if start_refresh:
+            submit(self._refresh)
+        if certs is not None and remaining > 0 and not force:
+            return certs
+        return self._fetch()
+
+    def verify(self, token, audience):
+        """驗證 Google ID token 並返回其內容，驗證失敗時拋出 ValueError"""
+        try:
+            idinfo = google_jwt.decode(token, certs=self.get_certs(), audience=audience)
+        except ValueError as e:
+            if "Certificate for key id" not in str(e):
+                raise
+            idinfo = google_jwt.decode(token, certs=self.get_certs(force=True), audience=audience)
+
+        if idinfo.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer: {idinfo.get('iss')}")
+        return idinfo
+
+    def stats(self):
+        """返回憑證快取狀態"""
+        with self._lock:
+            return {
+                "loaded": self._certs is not None,
+                "expires_in": round(max(self._expires_at - time.monotonic(), 0)),
+                "fetches": self._fetches,
+                "background_refreshes": self._background_refreshes,
+                "forced_refreshes": self._forced_refreshes,
+                "skipped_forced_refreshes": self._skipped_forced_refreshes
+            }
+
+google_verifier = GoogleCertVerifier(
+    GOOGLE_CERTS_REFRESH_MARGIN, GOOGLE_CERTS_DEFAULT_TTL, GOOGLE_CERTS_MIN_FORCED_INTERVAL
+)
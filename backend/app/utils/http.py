@@ -0,0 +1,242 @@
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from app.utils.singleflight import SingleFlight
+from app.config import (
+    HTTP_POOL_SIZE, HTTP_MAX_RETRIES, HTTP_BACKOFF_BASE, HTTP_BACKOFF_MAX,
+    HTTP_BREAKER_THRESHOLD, HTTP_BREAKER_RESET, HTTP_STREAM_CHUNK_SIZE
+)
+
+# 各端點的 (連線 timeout, 讀取 timeout) 秒數
+TIMEOUTS = {
+    "nearby": (3.05, 10),
+    "details": (3.05, 10),
+    "text_search": (3.05, 10),
+    "photo": (3.05, 20),
+    "photo_media": (3.05, 10),
+    "photo_download": (3.05, 20),
+    "google_certs": (3.05, 5),
+}
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# 需要重試的 HTTP 狀態碼與 Google API 狀態
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRY_API_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+
+class UpstreamUnavailableError(requests.RequestException):
+    """斷路器開啟中，暫時不向 Google 發送請求"""
+    pass
+
+class GoogleAPIError(Exception):
+    """Google API 返回非 OK 的狀態"""
+    pass
+
+class CircuitBreaker:
+    """
+    連續失敗達到門檻後開啟斷路器，reset_timeout 秒內直接失敗；
+    之後放行一個試探請求，成功則關閉斷路器，失敗則再次開啟
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def allow(self):
+        """是否允許發送請求"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            # 半開狀態：只放行一個試探請求
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+def _create_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+# 所有 Google 請求共用的連線池（keep-alive）
+session = _create_session()
+
+_get_flight = SingleFlight("google_get")
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "retries": 0, "failures": 0, "rejected": 0}
+
+def _breaker(endpoint):
+    with _breakers_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker(HTTP_BREAKER_THRESHOLD, HTTP_BREAKER_RESET)
+        return _breakers[endpoint]
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+def _should_retry(response, stream):
+    """判斷回應是否為暫時性錯誤"""
+    if response.status_code in RETRY_STATUS_CODES:
+        return True
+    if stream or "json" not in response.headers.get("content-type", ""):
+        return False
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    return isinstance(body, dict) and body.get("status") in RETRY_API_STATUSES
+
+def _backoff(attempt):
+    """帶完全隨機抖動的指數退避秒數"""
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+def google_request(method, endpoint, url, **kwargs):
+    """
+    透過共用連線池呼叫 Google API
+
+    參數:
+    - method: HTTP 方法
+    - endpoint: 端點名稱，決定 timeout 並各自擁有一個斷路器
+    - url: 請求網址
+    - 其餘參數直接傳給 requests（params、json、headers、stream 等）
+
+    遇到連線錯誤、5xx/429 或 OVER_QUERY_LIMIT 時以抖動退避重試，
+    重試用盡後返回最後一次回應或拋出最後一次例外
+    """
+    breaker = _breaker(endpoint)
+    if not breaker.allow():
+        _count("rejected")
+        raise UpstreamUnavailableError(f"Google {endpoint} API is temporarily unavailable")
+
+    kwargs.setdefault("timeout", TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT))
+    stream = kwargs.get("stream", False)
+
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        last_attempt = attempt == HTTP_MAX_RETRIES
+        _count("requests")
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if last_attempt:
+                _count("failures")
+                breaker.record_failure()
+                raise
+            print(f"Google {endpoint} 請求失敗，準備重試: {e}")
+        except requests.RequestException:
+            _count("failures")
+            breaker.record_failure()
+            raise
+        else:
+            if not _should_retry(response, stream):
+                breaker.record_success()
+                return response
+            if last_attempt:
+                _count("failures")
+                breaker.record_failure()
+                return response
+            print(f"Google {endpoint} 回應 {response.status_code}，準備重試")
+            response.close()
+
+        _count("retries")
+        time.sleep(_backoff(attempt))
+
+def _freeze(mapping):
+    return tuple(sorted((mapping or {}).items()))
+
+def google_get(endpoint, url, **kwargs):
+    """
+    以 GET 呼叫 Google API
+
+    非串流請求會合併相同網址與參數的並發呼叫，共用同一次上游回應
+    """
+    if kwargs.get("stream"):
+        return google_request("GET", endpoint, url, **kwargs)
+
+    key = (url, _freeze(kwargs.get("params")), _freeze(kwargs.get("headers")))
+
+    def load():
+        response = google_request("GET", endpoint, url, **kwargs)
+        # 先讀完回應內容，讓等待中的呼叫者可以安全共用
+        response.content
+        return response
+
+    return _get_flight.do(key, load)
+
+def google_post(endpoint, url, **kwargs):
+    """以 POST 呼叫 Google API"""
+    return google_request("POST", endpoint, url, **kwargs)
+
+def stream_upstream(response, writer=None, chunk_size=HTTP_STREAM_CHUNK_SIZE):
+    """
+    逐塊轉發上游串流回應，可同時寫入快取寫入器
+
+    完整讀完時提交寫入器；中途出錯或客戶端中斷時放棄寫入，
+    不會留下不完整的快取檔。結束時一定關閉上游連線
+    """
+    completed = False
+    try:
+        for chunk in response.iter_content(chunk_size):
+            if writer is not None:
+                writer.write(chunk)
+            yield chunk
+        completed = True
+    finally:
+        if writer is not None:
+            if completed:
+                writer.commit()
+            else:
+                writer.abort()
+        response.close()
+
+def passthrough_headers(response):
+    """
+    返回串流轉發時可沿用的上游標頭
+
+    requests 會自動解壓縮，上游有 Content-Encoding 時長度不同，不轉發 Content-Length
+    """
+    headers = {}
+    if "content-length" in response.headers and "content-encoding" not in response.headers:
+        headers["Content-Length"] = response.headers["content-length"]
+    return headers
+
+def get_http_stats():
+    """返回對外請求統計資料與各端點斷路器狀態"""
+    with _stats_lock:
+        stats = dict(_stats)
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    stats["breakers"] = {endpoint: breaker.state for endpoint, breaker in breakers.items()}
+    return stats
@@ -0,0 +1,399 @@
+import os
+import hashlib
+import tempfile
+import mimetypes
+import threading
+from collections import OrderedDict
+from app.config import (
+    PHOTO_CACHE_DIR, PHOTO_CACHE_MAX_BYTES, PHOTO_MEMORY_CACHE_MAX_BYTES,
+    PHOTO_MEMORY_CACHE_MAX_ITEM_BYTES, PHOTO_MEMORY_PROMOTE_HITS
+)
+from app.utils.background import submit
+
+DEFAULT_CONTENT_TYPE = "image/jpeg"
+
+# 常見圖片格式固定副檔名，避免 mimetypes 在不同系統上返回不同結果
+_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+}
+_CONTENT_TYPES = {ext: content_type for content_type, ext in _EXTENSIONS.items()}
+
+def _extension(content_type):
+    content_type = (content_type or DEFAULT_CONTENT_TYPE).split(";")[0].strip().lower()
+    return _EXTENSIONS.get(content_type) or mimetypes.guess_extension(content_type) or ".bin"
+
+def _content_type(filename):
+    ext = os.path.splitext(filename)[1].lower()
+    return _CONTENT_TYPES.get(ext) or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+class MemoryTier:
+    """
+    以總位元組數為上限的記憶體 LRU，保存最常被讀取的照片內容
+
+    超過 max_item_bytes 的照片不放入，避免少數大圖擠掉大量小圖
+    """
+
+    def __init__(self, max_bytes, max_item_bytes):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (內容, 內容類型)
+        self._total_bytes = 0
+        self._evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def accepts(self, size):
+        return 0 < size <= min(self.max_item_bytes, self.max_bytes)
+
+    def set(self, key, data, content_type):
+        if not self.accepts(len(data)):
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._total_bytes -= len(old[0])
+            self._data[key] = (data, content_type)
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes:
+                _, (evicted, _) = self._data.popitem(last=False)
+                self._total_bytes -= len(evicted)
+                self._evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._total_bytes -= len(old[0])
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions
+            }
+
+class PhotoCache:
+    """
+    有容量上限的照片磁碟快取
+
+    - 檔案依快取鍵前兩層分片存放（root/ab/cd/<key>.<ext>），避免單一目錄檔案過多
+    - 內容類型以副檔名保存，讀取時還原
+    - 寫入時先寫暫存檔再 rename，讀者不會讀到寫到一半的檔案
+    - 以記憶體中的存取索引做 LRU 淘汰，總大小超過 max_bytes 時淘汰到 90% 以下
+    - 索引在第一次使用時掃描目錄建立，以檔案修改時間作為初始存取順序
+    - 磁碟命中達到 promote_hits 次的照片在背景載入記憶體熱區（memory），
+      之後直接以記憶體內容提供，不再讀取磁碟
+    """
+
+    def __init__(self, root, max_bytes, memory=None, promote_hits=2):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.memory = memory
+        self.promote_hits = promote_hits
+        self._disk_hits = {}  # 尚未載入記憶體的 key -> 磁碟命中次數
+        self._promoting = set()
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # key -> (path, size, content_type)
+        self._total_bytes = 0
+        self._loaded = False
+        self._filling = {}  # 正在寫入的 key -> Event
+
+        self._hits = 0
+        self._memory_hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._evictions = 0
+        self._promotions = 0
+
+    @staticmethod
+    def make_key(*parts):
+        """以任意參數產生快取鍵"""
+        return hashlib.sha256("_".join(str(part) for part in parts).encode()).hexdigest()
+
+    def _shard_dir(self, key):
+        return os.path.join(self.root, key[:2], key[2:4])
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            entries = []
+            for dirpath, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    if filename.endswith(".tmp"):
+                        # 上次中斷留下的暫存檔
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+                        continue
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    key = os.path.splitext(filename)[0]
+                    entries.append((stat.st_mtime, key, path, stat.st_size, _content_type(filename)))
+
+            for _, key, path, size, content_type in sorted(entries):
+                self._index[key] = (path, size, content_type)
+                self._total_bytes += size
+            self._loaded = True
+
+    def contains(self, key):
+        """是否已有快取（不計入統計）"""
+        self._ensure_loaded()
+        with self._lock:
+            return key in self._index
+
+    def locate(self, key):
+        """返回磁碟上的 (檔案路徑, 內容類型)，不計入統計也不載入記憶體熱區"""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._index.get(key)
+        if entry is None:
+            return None
+        path, _, content_type = entry
+        return path, content_type
+
+    def get_memory(self, key):
+        """返回記憶體熱區中的 (內容, 內容類型)，未命中時返回 None"""
+        if self.memory is None:
+            return None
+        entry = self.memory.get(key)
+        if entry is None:
+            return None
+        self._ensure_loaded()
+        with self._lock:
+            # 同步磁碟索引的 LRU 順序，避免熱門照片在磁碟上被淘汰
+            if key in self._index:
+                self._index.move_to_end(key)
+            self._memory_hits += 1
+        return entry
+
+    def get(self, key):
+        """
+        返回磁碟上的 (檔案路徑, 內容類型)，未命中時返回 None
+
+        命中次數達到門檻時在背景將內容載入記憶體熱區
+        """
+        self._ensure_loaded()
+        promote = False
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._index.move_to_end(key)
+            self._hits += 1
+            path, size, content_type = entry
+
+            if self.memory is not None and self.memory.accepts(size) and key not in self._promoting:
+                hits = self._disk_hits.get(key, 0) + 1
+                if hits >= self.promote_hits:
+                    self._disk_hits.pop(key, None)
+                    self._promoting.add(key)
+                    promote = True
+                else:
+                    self._disk_hits[key] = hits
+
+        if promote:
+            submit(self._promote, key, path, content_type)
+        return path, content_type
+
+    def _promote(self, key, path, content_type):
+        """將磁碟上的照片載入記憶體熱區"""
+        try:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                self.forget(key)
+                return
+            with self._lock:
+                # 讀取期間已被覆寫或淘汰時不載入，避免提供舊內容
+                entry = self._index.get(key)
+                if entry is None or entry[0] != path:
+                    return
+                self.memory.set(key, data, content_type)
+                self._promotions += 1
+        finally:
+            with self._lock:
+                self._promoting.discard(key)
+
+    def put(self, key, data, content_type=None):
+        """以原子方式寫入快取，返回檔案路徑"""
+        writer = _CacheWriter(self, key, content_type)
+        try:
+            writer.write(data)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def writer(self, key, content_type=None):
+        """
+        返回串流寫入器，用於邊下載邊寫入快取
+
+        同一個 key 同時只允許一個寫入器；已有其他請求正在寫入時返回 None，
+        呼叫端可用 wait_for_fill() 等待其完成後再讀取快取
+        """
+        with self._lock:
+            if key in self._filling:
+                return None
+            self._filling[key] = threading.Event()
+        try:
+            return _CacheWriter(self, key, content_type, owns_fill=True)
+        except BaseException:
+            self._end_fill(key)
+            raise
+
+    def wait_for_fill(self, key, timeout=None):
+        """等待其他請求寫入同一個 key，返回是否曾經等待"""
+        with self._lock:
+            event = self._filling.get(key)
+        if event is None:
+            return False
+        event.wait(timeout)
+        return True
+
+    def _end_fill(self, key):
+        with self._lock:
+            event = self._filling.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def _commit(self, key, tmp_path, size, content_type):
+        """將寫好的暫存檔 rename 到正式位置並更新索引"""
+        content_type = (content_type or DEFAULT_CONTENT_TYPE).split(";")[0].strip()
+        path = os.path.join(self._shard_dir(key), key + _extension(content_type))
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+                if old[0] != path:
+                    self._remove_file(old[0])
+                self._drop_memory_locked(key)
+            self._index[key] = (path, size, content_type)
+            self._total_bytes += size
+            self._writes += 1
+            self._evict_locked()
+
+        return path
+
+    def _evict_locked(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        while self._index and self._total_bytes > target:
+            key, (path, size, _) = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self._drop_memory_locked(key)
+            self._evictions += 1
+            self._remove_file(path)
+
+    def forget(self, key):
+        """快取檔已不存在時移除索引"""
+        with self._lock:
+            entry = self._index.pop(key, None)
+            if entry is not None:
+                self._total_bytes -= entry[1]
+            self._drop_memory_locked(key)
+
+    def _drop_memory_locked(self, key):
+        self._disk_hits.pop(key, None)
+        if self.memory is not None:
+            self.memory.delete(key)
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        """返回快取統計資料"""
+        with self._lock:
+            return {
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "memory_hits": self._memory_hits,
+                "misses": self._misses,
+                "writes": self._writes,
+                "evictions": self._evictions,
+                "promotions": self._promotions,
+                "memory": self.memory.stats() if self.memory is not None else None
+            }
+
+class _CacheWriter:
+    """寫入暫存檔，commit() 時才 rename 成正式快取檔；abort() 丟棄暫存檔"""
+
+    def __init__(self, cache, key, content_type=None, owns_fill=False):
+        cache._ensure_loaded()
+        self.cache = cache
+        self.key = key
+        self.content_type = content_type
+        self._owns_fill = owns_fill
+        self._size = 0
+        self._done = False
+
+        shard_dir = cache._shard_dir(key)
+        os.makedirs(shard_dir, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=shard_dir, suffix=".tmp")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self._size += len(chunk)
+
+    def commit(self):
+        """完成寫入並返回快取檔路徑"""
+        if self._done:
+            return None
+        self._done = True
+        try:
+            self._file.close()
+            return self.cache._commit(self.key, self._tmp_path, self._size, self.content_type)
+        except BaseException:
+            PhotoCache._remove_file(self._tmp_path)
+            raise
+        finally:
+            if self._owns_fill:
+                self.cache._end_fill(self.key)
+
+    def abort(self):
+        """放棄寫入，不影響既有快取"""
+        if self._done:
+            return
+        self._done = True
+        try:
+            self._file.close()
+        finally:
+            PhotoCache._remove_file(self._tmp_path)
+            if self._owns_fill:
+                self.cache._end_fill(self.key)
+
+photo_cache = PhotoCache(
+    PHOTO_CACHE_DIR,
+    PHOTO_CACHE_MAX_BYTES,
+    memory=MemoryTier(PHOTO_MEMORY_CACHE_MAX_BYTES, PHOTO_MEMORY_CACHE_MAX_ITEM_BYTES),
+    promote_hits=PHOTO_MEMORY_PROMOTE_HITS
+)
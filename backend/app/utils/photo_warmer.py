@@ -0,0 +1,111 @@
+import queue
+import itertools
+import threading
+from app.config import PHOTO_WARM_WORKERS, PHOTO_WARM_QUEUE_SIZE, PHOTO_WARM_WIDTH
+from app.utils.photos import bucket_width, webp_supported, is_cached, ensure_variant
+
+class PhotoWarmer:
+    """
+    在背景把即將顯示的照片下載進照片快取
+
+    - 以固定數量的執行緒處理，不佔用請求執行緒或共用背景執行緒池
+    - 依優先順序處理（數字小的先處理），同順序時先加入的先處理
+    - 已在佇列中、正在下載或已有快取的照片不重複加入
+    - 佇列已滿時直接丟棄，預熱只是最佳化，不影響正常請求
+    """
+
+    def __init__(self, workers, max_queued, width):
+        self.workers = workers
+        self.width = bucket_width(width)
+        self._queue = queue.PriorityQueue(maxsize=max_queued)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._pending = set()  # 佇列中或正在下載的照片參考
+        self._started = False
+
+        self._queued = 0
+        self._warmed = 0
+        self._skipped = 0
+        self._dropped = 0
+        self._failures = 0
+
+    def _start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for i in range(self.workers):
+            threading.Thread(target=self._run, name=f"photo-warmer-{i}", daemon=True).start()
+
+    def _format(self):
+        # 瀏覽器大多接受 WebP，伺服器可以輸出時預熱 WebP 版本
+        return "webp" if webp_supported() else None
+
+    def warm(self, photo_references, base_priority=0):
+        """
+        將照片加入預熱佇列
+
+        photo_references 依卡片順序排列，越前面越先下載；
+        base_priority 用於讓預取的後續頁面排在目前頁面之後
+        """
+        fmt = self._format()
+        for position, photo_reference in enumerate(photo_references):
+            if not photo_reference:
+                continue
+            if is_cached(photo_reference, self.width, fmt):
+                continue
+            with self._lock:
+                if photo_reference in self._pending:
+                    continue
+                self._pending.add(photo_reference)
+            try:
+                self._queue.put_nowait((base_priority + position, next(self._seq), photo_reference))
+            except queue.Full:
+                with self._lock:
+                    self._pending.discard(photo_reference)
+                    self._dropped += 1
+                continue
+            with self._lock:
+                self._queued += 1
+        self._start()
+
+    def _run(self):
+        while True:
+            _, _, photo_reference = self._queue.get()
+            try:
+                self._warm_one(photo_reference)
+            finally:
+                with self._lock:
+                    self._pending.discard(photo_reference)
+                self._queue.task_done()
+
+    def _warm_one(self, photo_reference):
+        fmt = self._format()
+        if is_cached(photo_reference, self.width, fmt):
+            # 加入佇列後已被請求載入
+            with self._lock:
+                self._skipped += 1
+            return
+        try:
+            ensure_variant(photo_reference, self.width, fmt)
+        except Exception as e:
+            print(f"預熱照片失敗 {photo_reference[:20]}...: {e}")
+            with self._lock:
+                self._failures += 1
+            return
+        with self._lock:
+            self._warmed += 1
+
+    def stats(self):
+        """返回預熱統計資料"""
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "queued": self._queued,
+                "warmed": self._warmed,
+                "skipped": self._skipped,
+                "dropped": self._dropped,
+                "failures": self._failures
+            }
+
+photo_warmer = PhotoWarmer(PHOTO_WARM_WORKERS, PHOTO_WARM_QUEUE_SIZE, PHOTO_WARM_WIDTH)
@@ -0,0 +1,344 @@
+import io
+from flask import request, Response, send_file
+from app.config import (
+    GOOGLE_MAPS_API_KEY, PHOTO_WIDTH_BUCKETS, PHOTO_JPEG_QUALITY, PHOTO_WEBP_QUALITY,
+    PHOTO_URI_CACHE_TTL, PHOTO_URI_CACHE_MAX_ENTRIES
+)
+from app.utils.http import google_get, GoogleAPIError, stream_upstream, passthrough_headers
+from app.utils.cache import TTLCache
+from app.utils.photo_cache import photo_cache
+from app.utils.singleflight import SingleFlight
+
+# Pillow 為選用套件：未安裝時各級距直接向 Google 取得對應寬度的照片
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+PHOTO_URL = "https://maps.googleapis.com/maps/api/place/photo"
+V1_MEDIA_URL = "https://places.googleapis.com/v1/places/{place_id}/photos/{photo_reference}/media"
+ORIGINAL_WIDTH = PHOTO_WIDTH_BUCKETS[-1]
+CACHE_CONTROL = 'public, max-age=604800'  # 快取 7 天
+FILL_WAIT_TIMEOUT = 20  # 等待其他請求下載同一張照片的秒數
+
+_original_flight = SingleFlight("photo_original")
+_variant_flight = SingleFlight("photo_variant")
+
+# Places API v1 的 photoUri 為有時效的短期網址，只保存 PHOTO_URI_CACHE_TTL 秒；
+# 下載失敗時視為已失效並重新解析
+photo_uri_cache = TTLCache(ttl=PHOTO_URI_CACHE_TTL, max_entries=PHOTO_URI_CACHE_MAX_ENTRIES)
+
+# 原圖不大於級距寬度時，變體鍵 -> 原圖快取鍵；重啟後由磁碟上的原圖重新判斷
+_aliases = TTLCache(ttl=86400, max_entries=20000)
+
+# photoUri 失效時下載返回的狀態碼
+EXPIRED_URI_STATUS_CODES = {403, 404, 410}
+
+def bucket_width(max_width):
+    """返回不小於所需寬度的最小級距，超過最大級距時返回最大級距"""
+    for width in PHOTO_WIDTH_BUCKETS:
+        if width >= max_width:
+            return width
+    return ORIGINAL_WIDTH
+
+def webp_supported():
+    """是否可以在伺服器端輸出 WebP"""
+    return Image is not None and features.check("webp")
+
+def negotiate_format():
+    """客戶端明確接受 WebP 且可以輸出 WebP 時返回 'webp'，否則返回 None（沿用原圖格式）"""
+    if not webp_supported():
+        return None
+    # 只認明確列出的 image/webp，*/* 不代表瀏覽器能顯示 WebP
+    if "image/webp" not in request.headers.get("Accept", ""):
+        return None
+    return "webp"
+
+def _original_key(photo_reference):
+    return photo_cache.make_key("original", photo_reference, ORIGINAL_WIDTH)
+
+def variant_key(photo_reference, width, fmt):
+    return photo_cache.make_key("variant", photo_reference, width, fmt or "original")
+
+def _direct_source(photo_reference, width, fmt):
+    """
+    不需在伺服器端處理時返回 (快取鍵, 下載寬度)，需要縮放或轉檔時返回 None
+
+    沒有 Pillow 時直接向 Google 取得級距寬度；要求的就是原圖時直接使用原圖的快取
+    """
+    if Image is None:
+        return variant_key(photo_reference, width, None), width
+    if fmt is None and width == ORIGINAL_WIDTH:
+        return _original_key(photo_reference), ORIGINAL_WIDTH
+    return None
+
+def _open_download(photo_reference, width):
+    """以串流方式向 Google 取得指定寬度的照片，返回尚未讀取內容的回應"""
+    params = {
+        "maxwidth": width,
+        "photoreference": photo_reference,
+        "key": GOOGLE_MAPS_API_KEY
+    }
+    response = google_get("photo", PHOTO_URL, params=params, stream=True)
+    if response.status_code != 200:
+        response.close()
+        raise GoogleAPIError(f"HTTP {response.status_code}")
+    return response
+
+def _download_to_cache(key, open_response):
+    """
+    將上游回應逐塊寫入快取，返回快取鍵；不在記憶體中保留整張照片
+
+    其他請求正在邊轉發邊寫入同一個 key 時等待其完成
+    """
+    writer = photo_cache.writer(key)
+    if writer is None:
+        photo_cache.wait_for_fill(key, timeout=FILL_WAIT_TIMEOUT)
+    else:
+        try:
+            response = open_response()
+        except BaseException:
+            writer.abort()
+            raise
+        writer.content_type = response.headers.get("content-type", "image/jpeg")
+        for _ in stream_upstream(response, writer):
+            pass
+
+    if not photo_cache.contains(key):
+        raise GoogleAPIError("照片下載未完成")
+    return key
+
+def _stream_to_cache(key, open_response, etag):
+    """
+    快取未命中時邊轉發上游內容邊寫入快取，返回串流回應
+
+    同一個 key 同時只有一個請求下載，其他請求等待下載完成後由快取提供
+    """
+    writer = photo_cache.writer(key)
+    if writer is None:
+        photo_cache.wait_for_fill(key, timeout=FILL_WAIT_TIMEOUT)
+        return serve_cached_photo(key, etag)
+
+    try:
+        response = open_response()
+    except BaseException:
+        writer.abort()
+        raise
+
+    content_type = response.headers.get("content-type", "image/jpeg")
+    writer.content_type = content_type
+    photo = Response(
+        stream_upstream(response, writer),
+        content_type=content_type,
+        headers={'Cache-Control': CACHE_CONTROL, **passthrough_headers(response)}
+    )
+    photo.set_etag(etag)
+    photo.vary.add("Accept")
+    # 串流未開始就結束時（例如 HEAD 請求）放棄寫入並釋放上游連線；
+    # 已完整寫入時 abort() 不會有作用
+    photo.call_on_close(writer.abort)
+    photo.call_on_close(response.close)
+    return photo
+
+def _original_entry(photo_reference):
+    """返回原圖在磁碟上的 (檔案路徑, 內容類型)；每個照片參考只向 Google 下載並快取一次"""
+    key = _original_key(photo_reference)
+    entry = photo_cache.locate(key)
+    if entry is None:
+        _original_flight.do(key, lambda: _download_to_cache(
+            key, lambda: _open_download(photo_reference, ORIGINAL_WIDTH)
+        ))
+        entry = photo_cache.locate(key)
+        if entry is None:
+            raise GoogleAPIError("照片下載未完成")
+    return entry
+
+def _resize(path, width, fmt):
+    """
+    由磁碟上的原圖縮小到指定寬度（不放大）並編碼，返回 (內容, 內容類型)
+
+    不需縮放也不需轉檔或無法處理時返回 None；JPEG 由 thumbnail() 以縮小尺寸解碼，
+    不會完整解碼大圖
+    """
+    try:
+        with Image.open(path) as image:
+            if image.width <= width and fmt is None:
+                return None
+            image.thumbnail((width, image.height), Image.LANCZOS)
+
+            output = io.BytesIO()
+            if fmt == "webp":
+                image.save(output, format="WEBP", quality=PHOTO_WEBP_QUALITY)
+                return output.getvalue(), "image/webp"
+
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            image.save(output, format="JPEG", quality=PHOTO_JPEG_QUALITY, optimize=True, progressive=True)
+            return output.getvalue(), "image/jpeg"
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        print(f"照片縮放失敗: {e}")
+        return None
+
+def _build_variant(photo_reference, width, fmt, key):
+    try:
+        path, _ = _original_entry(photo_reference)
+        resized = _resize(path, width, fmt)
+    except FileNotFoundError:
+        # 原圖在查詢索引後被淘汰，重新下載一次
+        photo_cache.forget(_original_key(photo_reference))
+        path, _ = _original_entry(photo_reference)
+        resized = _resize(path, width, fmt)
+
+    if resized is None:
+        # 原圖已不大於級距寬度，變體直接使用原圖的快取，不重複保存相同內容
+        original = _original_key(photo_reference)
+        _aliases.set(key, original)
+        return original
+
+    data, content_type = resized
+    photo_cache.put(key, data, content_type)
+    return key
+
+def ensure_variant(photo_reference, width, fmt=None):
+    """
+    確保指定級距與格式的照片已在快取中，返回快取鍵
+
+    變體在第一次被請求時由快取的原圖產生，之後直接由快取提供；
+    與原圖內容相同的變體返回原圖的快取鍵。Google 返回錯誤時拋出 GoogleAPIError
+    """
+    direct = _direct_source(photo_reference, width, fmt)
+    if direct is not None:
+        key, download_width = direct
+        if photo_cache.contains(key):
+            return key
+        return _variant_flight.do(key, lambda: _download_to_cache(
+            key, lambda: _open_download(photo_reference, download_width)
+        ))
+
+    key = variant_key(photo_reference, width, fmt)
+    alias = _aliases.get(key)
+    if alias is not None and photo_cache.contains(alias):
+        return alias
+    if photo_cache.contains(key):
+        return key
+    return _variant_flight.do(key, lambda: _build_variant(photo_reference, width, fmt, key))
+
+def is_cached(photo_reference, width, fmt=None):
+    """指定級距與格式的照片是否已在快取中"""
+    direct = _direct_source(photo_reference, width, fmt)
+    if direct is not None:
+        return photo_cache.contains(direct[0])
+    key = variant_key(photo_reference, width, fmt)
+    alias = _aliases.get(key)
+    return photo_cache.contains(alias if alias is not None else key)
+
+def photo_response(photo_reference, width, fmt, etag):
+    """
+    返回指定級距與格式的照片回應
+
+    快取命中時由快取提供；不需縮放或轉檔時邊下載邊轉發並寫入快取；
+    需要縮放時先將原圖串流寫入磁碟，再由磁碟上的原圖產生變體。
+    Google 返回錯誤時拋出 GoogleAPIError
+    """
+    direct = _direct_source(photo_reference, width, fmt)
+    if direct is None:
+        return serve_cached_photo(ensure_variant(photo_reference, width, fmt), etag)
+
+    key, download_width = direct
+    cached = serve_cached_photo(key, etag)
+    if cached is not None:
+        return cached
+    return _stream_to_cache(key, lambda: _open_download(photo_reference, download_width), etag)
+
+def _resolve_photo_uri(place_id, photo_reference, width):
+    """以 Places API v1 將照片資源解析為可下載的 photoUri"""
+    url = V1_MEDIA_URL.format(place_id=place_id, photo_reference=photo_reference)
+    params = {
+        "maxWidthPx": width,
+        "skipHttpRedirect": "true",
+        "key": GOOGLE_MAPS_API_KEY
+    }
+    response = google_get("photo_media", url, params=params)
+    if response.status_code != 200:
+        raise GoogleAPIError(f"無法獲取照片URI: HTTP {response.status_code}")
+
+    photo_uri = response.json().get("photoUri")
+    if not photo_uri:
+        raise GoogleAPIError("回應中沒有photoUri")
+    return photo_uri
+
+def _open_v1_download(place_id, photo_reference, width):
+    """以串流方式下載 Places API v1 照片，返回尚未讀取內容的回應"""
+    uri_key = (place_id, photo_reference, width)
+    photo_uri = photo_uri_cache.get(uri_key)
+    from_cache = photo_uri is not None
+    if not from_cache:
+        photo_uri = _resolve_photo_uri(place_id, photo_reference, width)
+        photo_uri_cache.set(uri_key, photo_uri)
+
+    response = google_get("photo_download", photo_uri, stream=True)
+    if response.status_code in EXPIRED_URI_STATUS_CODES and from_cache:
+        # 快取的 photoUri 已失效，重新解析一次
+        response.close()
+        photo_uri_cache.delete(uri_key)
+        photo_uri = _resolve_photo_uri(place_id, photo_reference, width)
+        photo_uri_cache.set(uri_key, photo_uri)
+        response = google_get("photo_download", photo_uri, stream=True)
+
+    if response.status_code != 200:
+        response.close()
+        raise GoogleAPIError(f"無法獲取照片內容: HTTP {response.status_code}")
+    return response
+
+def _v1_key(place_id, photo_reference, width):
+    return photo_cache.make_key("v1", place_id, photo_reference, width)
+
+def v1_photo_response(place_id, photo_reference, width, etag):
+    """返回 Places API v1 照片回應，快取未命中時邊下載邊轉發並寫入快取"""
+    key = _v1_key(place_id, photo_reference, width)
+    cached = serve_cached_photo(key, etag)
+    if cached is not None:
+        return cached
+    return _stream_to_cache(key, lambda: _open_v1_download(place_id, photo_reference, width), etag)
+
+def serve_cached_photo(cache_key, etag):
+    """
+    快取命中時返回照片回應，否則返回 None
+
+    記憶體熱區命中時直接以記憶體內容回應；磁碟命中時以 send_file 回應，
+    由伺服器以 sendfile 傳送檔案而不讀入 Python，兩者都支援 Range 請求
+    """
+    cached = photo_cache.get_memory(cache_key)
+    if cached:
+        cached_image, content_type = cached
+        response = Response(
+            cached_image,
+            content_type=content_type,
+            headers={'Cache-Control': CACHE_CONTROL}
+        )
+        response.set_etag(etag)
+        response = response.make_conditional(request, accept_ranges=True, complete_length=len(cached_image))
+    else:
+        cached = photo_cache.get(cache_key)
+        if not cached:
+            return None
+
+        path, content_type = cached
+        try:
+            response = send_file(
+                path,
+                mimetype=content_type,
+                conditional=True,
+                etag=etag,
+                max_age=604800  # 快取 7 天
+            )
+        except FileNotFoundError:
+            # 檔案在查詢索引後被淘汰
+            photo_cache.forget(cache_key)
+            return None
+
+    # 同一網址依 Accept 可能返回 WebP 或原圖格式
+    response.vary.add("Accept")
+    return response
@@ -0,0 +1,203 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.config import (
+    GOOGLE_MAPS_API_KEY, DETAILS_CACHE_TTL, DETAILS_CACHE_STALE_TTL, DETAILS_FANOUT_WORKERS
+)
+from app.utils.db import execute_query
+from app.utils.http import google_get, GoogleAPIError
+from app.utils.background import submit
+from app.utils.singleflight import SingleFlight
+
+DETAILS_URL = "https://maps.googleapis.com/maps/api/place/details/json"
+
+_flight = SingleFlight("place_details")
+
+# 批次查詢時並行呼叫 Google 的執行緒池
+_fanout_executor = ThreadPoolExecutor(max_workers=DETAILS_FANOUT_WORKERS, thread_name_prefix="details")
+_refreshing = set()
+_lock = threading.Lock()
+_stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0}
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+def _top_level(field):
+    """欄位遮罩中的巢狀欄位（如 geometry/location）以頂層欄位為單位快取"""
+    return field.split("/")[0]
+
+def _parse_cached(row):
+    return set(row["fields"].split(",")), json.loads(row["data"]), row["age"]
+
+def _load_cached(place_id, language):
+    """返回 (欄位集合, 資料, 已快取秒數)，沒有快取時返回 None"""
+    row = execute_query(
+        """
+            SELECT fields, data, TIMESTAMPDIFF(SECOND, fetched_at, NOW()) AS age
+            FROM place_details_cache
+            WHERE place_id = %s AND language = %s
+        """,
+        (place_id, language or ""),
+        fetch_one=True
+    )
+    if not row:
+        return None
+    return _parse_cached(row)
+
+def _load_cached_many(place_ids, language):
+    """以一次查詢載入多個地點的快取，返回 {place_id: (欄位集合, 資料, 已快取秒數)}"""
+    placeholders = ", ".join(["%s"] * len(place_ids))
+    rows = execute_query(
+        f"""
+            SELECT place_id, fields, data, TIMESTAMPDIFF(SECOND, fetched_at, NOW()) AS age
+            FROM place_details_cache
+            WHERE place_id IN ({placeholders}) AND language = %s
+        """,
+        (*place_ids, language or ""),
+        fetch_all=True
+    ) or []
+    return {row["place_id"]: _parse_cached(row) for row in rows}
+
+def _store(place_id, language, fields, data):
+    execute_query(
+        """
+            INSERT INTO place_details_cache (place_id, language, fields, data)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                fields = VALUES(fields),
+                data = VALUES(data),
+                fetched_at = CURRENT_TIMESTAMP
+        """,
+        (place_id, language or "", ",".join(sorted(fields)), json.dumps(data, ensure_ascii=False)),
+        commit=True
+    )
+
+def _fetch(place_id, fields, language):
+    """呼叫 Google Place Details，返回 result 並寫入快取；相同請求並發時只呼叫一次"""
+    key = (place_id, language, frozenset(fields))
+    return _flight.do(key, lambda: _fetch_uncached(place_id, fields, language))
+
+def _fetch_uncached(place_id, fields, language):
+    params = {
+        "place_id": place_id,
+        "fields": ",".join(sorted(fields)),
+        "key": GOOGLE_MAPS_API_KEY
+    }
+    if language:
+        params["language"] = language
+
+    response = google_get("details", DETAILS_URL, params=params)
+    if response.status_code != 200:
+        raise GoogleAPIError(f"HTTP {response.status_code}")
+
+    data = response.json()
+    if data.get("status") != "OK":
+        raise GoogleAPIError(f"{data.get('status')} - {data.get('error_message', '未知錯誤')}")
+
+    result = data.get("result", {})
+    _store(place_id, language, fields, result)
+    return result
+
+def _refresh(place_id, fields, language):
+    try:
+        _fetch(place_id, fields, language)
+    finally:
+        with _lock:
+            _refreshing.discard((place_id, language))
+
+def _subset(data, fields):
+    return {field: data[field] for field in fields if field in data}
+
+def _from_cache(place_id, requested, cached, language):
+    """
+    嘗試以快取提供所需欄位，返回 (資料, 需要向 Google 取得的欄位)
+
+    可由快取提供時需要取得的欄位為 None；過期但仍可使用的快取會排入背景刷新
+    """
+    if not cached:
+        return None, requested
+
+    cached_fields, data, age = cached
+    if not requested <= cached_fields:
+        return None, requested | cached_fields
+
+    if age < DETAILS_CACHE_TTL:
+        _count("hits")
+        return _subset(data, requested), None
+
+    if age < DETAILS_CACHE_TTL + DETAILS_CACHE_STALE_TTL:
+        _count("stale_hits")
+        key = (place_id, language)
+        with _lock:
+            start_refresh = key not in _refreshing
+            if start_refresh:
+                _refreshing.add(key)
+                _stats["refreshes"] += 1
+        if start_refresh:
+            submit(_refresh, place_id, cached_fields, language)
+        return _subset(data, requested), None
+
+    return None, requested | cached_fields
+
+def get_details(place_id, fields, language=None):
+    """
+    返回地點詳情中指定欄位的資料，優先使用 place_details_cache 表
+
+    - 快取的欄位包含所需欄位且未過期時直接返回，不呼叫 Google
+    - 過期但仍在 DETAILS_CACHE_STALE_TTL 內時先返回舊資料，並在背景刷新
+    - 否則以「所需欄位 + 已快取欄位」呼叫 Google 並更新整筆快取，
+      讓之後較窄的請求也能由這筆較寬的快取提供
+
+    Google 返回錯誤時拋出 GoogleAPIError
+    """
+    requested = {_top_level(field) for field in fields}
+    data, fetch_fields = _from_cache(place_id, requested, _load_cached(place_id, language), language)
+    if fetch_fields is None:
+        return data
+
+    _count("misses")
+    result = _fetch(place_id, fetch_fields, language)
+    return _subset(result, requested)
+
+def get_details_many(place_ids, fields, language=None):
+    """
+    批次返回多個地點的詳情，規則與 get_details 相同
+
+    以一次查詢讀取所有快取，缺少的地點以執行緒池並行向 Google 取得。
+    返回 {place_id: 資料}，無法取得詳情的地點值為 None
+    """
+    place_ids = list(dict.fromkeys(place_ids))
+    if not place_ids:
+        return {}
+
+    requested = {_top_level(field) for field in fields}
+    cached = _load_cached_many(place_ids, language)
+
+    results = {}
+    missing = {}
+    for place_id in place_ids:
+        data, fetch_fields = _from_cache(place_id, requested, cached.get(place_id), language)
+        if fetch_fields is None:
+            results[place_id] = data
+        else:
+            missing[place_id] = fetch_fields
+
+    futures = {}
+    for place_id, fetch_fields in missing.items():
+        _count("misses")
+        futures[place_id] = _fanout_executor.submit(_fetch, place_id, fetch_fields, language)
+
+    for place_id, future in futures.items():
+        try:
+            results[place_id] = _subset(future.result(), requested)
+        except Exception as e:
+            print(f"獲取地點 {place_id} 詳情失敗: {e}")
+            results[place_id] = None
+
+    return results
+
+def get_details_stats():
+    """返回地點詳情快取統計資料"""
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,117 @@
+import numpy as np
+from collections import Counter
+from app.config import (
+    RANKING_WEIGHT_RATING, RANKING_WEIGHT_POPULARITY, RANKING_WEIGHT_DISTANCE, RANKING_WEIGHT_AFFINITY,
+    RANKING_PRIOR_RATING, RANKING_PRIOR_COUNT, RANKING_PROFILE_TTL
+)
+from app.utils.db import execute_query
+from app.utils.cache import TTLCache
+from app.utils.geo import EARTH_RADIUS_M
+
+WEIGHTS = {
+    "rating": RANKING_WEIGHT_RATING,
+    "popularity": RANKING_WEIGHT_POPULARITY,
+    "distance": RANKING_WEIGHT_DISTANCE,
+    "affinity": RANKING_WEIGHT_AFFINITY,
+}
+
+# 幾乎所有餐廳都有的類型，不用於判斷用戶偏好
+GENERIC_TYPES = {"restaurant", "food", "point_of_interest", "establishment"}
+
+# 用戶收藏的類型分布（user_id -> {類型: 比例}）
+_profiles = TTLCache(ttl=RANKING_PROFILE_TTL, max_entries=10000)
+
+def get_type_profile(user_id):
+    """返回用戶收藏餐廳的類型分布，比例總和為 1；沒有收藏時返回空 dict"""
+    def load():
+        rows = execute_query(
+            """
+                SELECT r.types FROM favorites f
+                JOIN restaurants r ON r.id = f.restaurant_id
+                WHERE f.user_id = %s
+            """,
+            (user_id,),
+            fetch_all=True
+        )
+        if rows is None:
+            return None
+        counts = Counter(
+            place_type
+            for row in rows if row["types"]
+            for place_type in row["types"].split(",")
+            if place_type not in GENERIC_TYPES
+        )
+        total = sum(counts.values())
+        return {place_type: count / total for place_type, count in counts.items()} if total else {}
+
+    return _profiles.get_or_load(user_id, load) or {}
+
+def invalidate_type_profile(user_id):
+    """用戶收藏變更後呼叫，下次排序時重新計算類型分布"""
+    _profiles.delete(user_id)
+
+def haversine_many(lat, lng, lats, lngs):
+    """計算一點到多個點的球面距離（公尺），座標缺失時為 NaN"""
+    phi1 = np.radians(lat)
+    phi2 = np.radians(lats)
+    d_phi = phi2 - phi1
+    d_lambda = np.radians(lngs - lng)
+    a = np.sin(d_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def score_restaurants(restaurants, lat, lng, radius, profile=None, weights=WEIGHTS):
+    """
+    以 NumPy 一次計算所有候選餐廳的分數，返回 (分數陣列, 距離陣列)
+
+    - rating: 以評論數做貝氏平滑的評分 (n * r + m * C) / (n + m)，除以 5
+    - popularity: log(1 + 評論數) 相對於候選中的最大值
+    - distance: 1 - 距離 / 搜尋半徑，超出半徑或沒有座標時為 0
+    - affinity: 候選餐廳類型在用戶收藏類型分布中的比例總和
+    """
+    count = len(restaurants)
+    ratings = np.fromiter((r.get("rating") or 0 for r in restaurants), dtype=float, count=count)
+    totals = np.fromiter((r.get("user_ratings_total") or 0 for r in restaurants), dtype=float, count=count)
+    lats = np.array([r.get("lat") for r in restaurants], dtype=float)
+    lngs = np.array([r.get("lng") for r in restaurants], dtype=float)
+
+    rating_score = (totals * ratings + RANKING_PRIOR_COUNT * RANKING_PRIOR_RATING) / (totals + RANKING_PRIOR_COUNT) / 5
+
+    log_totals = np.log1p(totals)
+    max_log_total = log_totals.max(initial=0)
+    popularity_score = log_totals / max_log_total if max_log_total > 0 else np.zeros(count)
+
+    distances = haversine_many(lat, lng, lats, lngs)
+    distance_score = np.nan_to_num(np.clip(1 - distances / max(radius, 1), 0, 1))
+
+    if profile:
+        affinity_score = np.fromiter(
+            (min(sum(profile.get(t, 0) for t in r.get("types") or ()), 1) for r in restaurants),
+            dtype=float,
+            count=count
+        )
+    else:
+        affinity_score = np.zeros(count)
+
+    scores = (
+        weights["rating"] * rating_score
+        + weights["popularity"] * popularity_score
+        + weights["distance"] * distance_score
+        + weights["affinity"] * affinity_score
+    )
+    return scores, distances
+
+def rank_restaurants(restaurants, lat, lng, radius, profile=None, weights=WEIGHTS):
+    """返回依分數由高到低排序的餐廳副本，並附上與搜尋位置的距離 distance（公尺）"""
+    if not restaurants:
+        return []
+
+    scores, distances = score_restaurants(restaurants, lat, lng, radius, profile, weights)
+    # 同分時維持原本順序
+    order = np.argsort(-scores, kind="stable")
+    return [
+        dict(
+            restaurants[i],
+            distance=None if np.isnan(distances[i]) else int(round(distances[i]))
+        )
+        for i in order
+    ]
@@ -0,0 +1,71 @@
+import threading
+
+# 所有 SingleFlight 實例，用於統計
+_registry = {}
+_registry_lock = threading.Lock()
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    合併相同 key 的並發呼叫
+
+    同一個 key 同時只有第一個呼叫者（leader）真正執行 fn，
+    其他呼叫者等待並共用其結果或例外；執行結束後不保留結果
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._executed = 0
+        self._coalesced = 0
+
+        with _registry_lock:
+            _registry[name] = self
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._executed += 1
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executed": self._executed,
+                "coalesced": self._coalesced
+            }
+
+def get_singleflight_stats():
+    """返回各 SingleFlight 實際執行與被合併的呼叫次數"""
+    with _registry_lock:
+        flights = dict(_registry)
+    return {name: flight.stats() for name, flight in flights.items()}
@@ -0,0 +1,97 @@
+import time
+import pytest
+from app.utils import cache
+from app.utils.cache import TTLCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+def wait_for(predicate, timeout=2):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_get_returns_fresh_value_until_ttl(clock):
+    ttl_cache = TTLCache(ttl=10)
+    ttl_cache.set("a", 1)
+    clock.now += 9
+    assert ttl_cache.get("a") == 1
+    clock.now += 2
+    assert ttl_cache.get("a") is None
+
+def test_get_or_load_loads_once_and_skips_none(clock):
+    ttl_cache = TTLCache(ttl=10)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return "value"
+
+    assert ttl_cache.get_or_load("a", loader) == "value"
+    assert ttl_cache.get_or_load("a", loader) == "value"
+    assert len(calls) == 1
+
+    assert ttl_cache.get_or_load("b", lambda: None) is None
+    assert not ttl_cache.contains("b")
+
+def test_stale_value_is_returned_and_refreshed_in_background(clock):
+    ttl_cache = TTLCache(ttl=10, stale_ttl=60)
+    ttl_cache.set("a", "old")
+    clock.now += 20
+
+    assert ttl_cache.get_or_load("a", lambda: "new") == "old"
+    assert wait_for(lambda: ttl_cache.get("a") == "new")
+    assert ttl_cache.stats()["refreshes"] == 1
+
+def test_stale_value_without_refresh(clock):
+    ttl_cache = TTLCache(ttl=10, stale_ttl=60)
+    ttl_cache.set("a", "old")
+    clock.now += 20
+
+    def loader():
+        raise AssertionError("should not reload")
+
+    assert ttl_cache.get_or_load("a", loader, refresh=False) == "old"
+    assert ttl_cache.stats()["refreshes"] == 0
+
+def test_expired_beyond_stale_ttl_loads_synchronously(clock):
+    ttl_cache = TTLCache(ttl=10, stale_ttl=60)
+    ttl_cache.set("a", "old")
+    clock.now += 100
+    assert ttl_cache.get_or_load("a", lambda: "new") == "new"
+
+def test_evicts_least_recently_used(clock):
+    ttl_cache = TTLCache(ttl=10, max_entries=2)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+    ttl_cache.get("a")
+    ttl_cache.set("c", 3)
+    assert ttl_cache.get("a") == 1
+    assert ttl_cache.get("b") is None
+    assert ttl_cache.stats()["evictions"] == 1
+
+def test_get_or_load_skips_values_rejected_by_cacheable(clock):
+    ttl_cache = TTLCache(ttl=10, stale_ttl=60)
+    complete = lambda value: None not in value
+
+    assert ttl_cache.get_or_load("a", lambda: [1, None], cacheable=complete) == [1, None]
+    assert not ttl_cache.contains("a")
+
+    ttl_cache.set("b", [1, 2])
+    clock.now += 20
+    assert ttl_cache.get_or_load("b", lambda: [None], cacheable=complete) == [1, 2]
+    assert wait_for(lambda: ttl_cache.stats()["refreshes"] == 1 and not ttl_cache._refreshing)
+    assert ttl_cache.get_or_load("b", lambda: [3], refresh=False) == [1, 2]
@@ -0,0 +1,49 @@
+import json
+import base64
+import pytest
+from app.utils import cursor
+from app.utils.cursor import encode_cursor, decode_cursor
+
+def _payload(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+def test_round_trip():
+    data = {"tile": "wsqqm", "radius": 1000, "page": 1, "token": None}
+    assert decode_cursor(encode_cursor(data), ("tile", "page")) == data
+
+def test_rejects_modified_payload():
+    value = encode_cursor({"tile": "wsqqm", "page": 1})
+    _, signature = value.split(".")
+    with pytest.raises(ValueError):
+        decode_cursor(f"{_payload({'tile': 'other', 'page': 1})}.{signature}")
+
+def test_rejects_modified_signature():
+    value = encode_cursor({"page": 1})
+    payload, signature = value.split(".")
+    tampered = ("A" if signature[0] != "A" else "B") + signature[1:]
+    with pytest.raises(ValueError):
+        decode_cursor(f"{payload}.{tampered}")
+
+def test_rejects_unsigned_cursor():
+    with pytest.raises(ValueError):
+        decode_cursor(_payload({"page": 1}))
+
+def test_rejects_cursor_signed_with_other_key(monkeypatch):
+    value = encode_cursor({"page": 1})
+    monkeypatch.setattr(cursor, "SECRET_KEY", "another-secret")
+    with pytest.raises(ValueError):
+        decode_cursor(value)
+
+@pytest.mark.parametrize("value", ["", ".", "not-base64!.??", "a.b.c"])
+def test_rejects_garbage(value):
+    with pytest.raises(ValueError):
+        decode_cursor(value)
+
+def test_requires_fields():
+    value = encode_cursor({"created_at": "2024-01-01 00:00:00"})
+    with pytest.raises(ValueError):
+        decode_cursor(value, ("created_at", "id"))
+
+def test_rejects_non_object_payload():
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor([1, 2, 3]))
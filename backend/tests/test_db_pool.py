@@ -0,0 +1,157 @@
+import threading
+import pytest
+from mysql.connector.errors import OperationalError
+from app.utils import db
+from app.utils.db import ConnectionPool, PoolTimeoutError
+
+class FakeCursor:
+    def __init__(self, raw):
+        self.raw = raw
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        if self.raw.fail_with is not None:
+            raise self.raw.fail_with
+
+    def fetchone(self):
+        return {"ok": 1}
+
+    def close(self):
+        pass
+
+class FakeRaw:
+    def __init__(self):
+        self.connected = True
+        self.closed = False
+        self.in_transaction = False
+        self.fail_with = None
+
+    def is_connected(self):
+        return self.connected
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+class FakePool(ConnectionPool):
+    def __init__(self, **kwargs):
+        super().__init__({}, **kwargs)
+        self.connections = []
+
+    def _connect(self):
+        raw = FakeRaw()
+        self.connections.append(raw)
+        return raw
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(db.time, "monotonic", clock)
+    return clock
+
+def test_reuses_released_connection():
+    pool = FakePool(size=2)
+    conn = pool.acquire()
+    raw = conn._raw
+    conn.close()
+    assert pool.acquire()._raw is raw
+    assert len(pool.connections) == 1
+
+def test_checkout_timeout_raises_pool_timeout_error():
+    pool = FakePool(size=1, timeout=0.05)
+    pool.acquire()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    stats = pool.stats()
+    assert stats["timeouts"] == 1
+    assert stats["open"] == 1
+
+def test_waiter_wakes_when_connection_is_released():
+    pool = FakePool(size=1, timeout=2)
+    conn = pool.acquire()
+    acquired = []
+
+    def wait_for_connection():
+        acquired.append(pool.acquire())
+
+    waiter = threading.Thread(target=wait_for_connection)
+    waiter.start()
+    for _ in range(200):
+        if pool.stats()["waits"]:
+            break
+        threading.Event().wait(0.01)
+    conn.close()
+    waiter.join(2)
+
+    assert len(acquired) == 1
+    assert acquired[0]._raw is conn._raw
+    assert pool.stats()["timeouts"] == 0
+
+def test_connection_older_than_recycle_is_replaced(clock):
+    pool = FakePool(size=1, recycle=60, health_check_interval=3600)
+    conn = pool.acquire()
+    old = conn._raw
+    conn.close()
+
+    clock.now += 61
+    new = pool.acquire()._raw
+
+    assert new is not old
+    assert old.closed
+    assert pool.stats()["recycled"] == 1
+
+def test_failed_health_check_forces_reconnect(clock):
+    pool = FakePool(size=1, recycle=3600, health_check_interval=30)
+    conn = pool.acquire()
+    old = conn._raw
+    conn.close()
+
+    old.connected = False
+    clock.now += 31
+    new = pool.acquire()._raw
+
+    assert new is not old
+    assert old.closed
+    assert pool.stats()["health_check_failures"] == 1
+
+def test_idle_connection_within_interval_is_not_pinged(clock):
+    pool = FakePool(size=1, recycle=3600, health_check_interval=30)
+    conn = pool.acquire()
+    old = conn._raw
+    conn.close()
+
+    old.connected = False  # 未超過間隔時不檢查
+    clock.now += 5
+    assert pool.acquire()._raw is old
+
+def test_operational_error_invalidates_connection(monkeypatch):
+    pool = FakePool(size=1)
+    monkeypatch.setattr(db, "get_pool", lambda: pool)
+
+    conn = pool.acquire()
+    raw = conn._raw
+    conn.close()
+    raw.fail_with = OperationalError(msg="server has gone away")
+
+    assert db.execute_query("SELECT 1", fetch_one=True) is None
+    assert raw.closed
+    assert pool.stats()["open"] == 0
+
+    # 下一次查詢建立新連線
+    assert db.execute_query("SELECT 1", fetch_one=True) == {"ok": 1}
+    assert len(pool.connections) == 2
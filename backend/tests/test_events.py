@@ -0,0 +1,79 @@
+from datetime import datetime, timezone
+import pytest
+from app.routes.events import parse_timestamp, parse_int, MAX_INT
+
+def test_parse_timestamp_converts_epoch_ms_to_utc():
+    assert parse_timestamp(1700000000123) == datetime(2023, 11, 14, 22, 13, 20, 123000)
+
+def test_parse_timestamp_defaults_to_now():
+    assert abs((datetime.now(timezone.utc).replace(tzinfo=None) - parse_timestamp(None)).total_seconds()) < 5
+
+@pytest.mark.parametrize("value", [0, -1, 2 ** 31 * 1000, 1e20, float("inf"), "nan", "abc", True, [1]])
+def test_parse_timestamp_rejects_values_outside_timestamp_column(value):
+    with pytest.raises((ValueError, TypeError, OverflowError, OSError)):
+        parse_timestamp(value)
+
+def test_parse_int_accepts_column_range():
+    assert parse_int("5", 1) == 5
+    assert parse_int(MAX_INT, 0) == MAX_INT
+    assert parse_int(0, 0) == 0
+
+@pytest.mark.parametrize("value, minimum", [(0, 1), (-1, 0), (MAX_INT + 1, 0), (True, 0), ("x", 0)])
+def test_parse_int_rejects_out_of_range(value, minimum):
+    with pytest.raises(ValueError):
+        parse_int(value, minimum)
+
+from mysql.connector.errors import DataError, OperationalError
+from app.utils.event_log import SwipeEventLog
+
+def make_log(monkeypatch, insert):
+    log = SwipeEventLog(max_queued=10, batch_size=5, flush_interval=0)
+    monkeypatch.setattr(log, "_insert", insert)
+    return log
+
+def test_write_retries_rows_individually_on_data_error(monkeypatch):
+    written = []
+    def insert(batch):
+        if len(batch) > 1 or batch[0] == "bad":
+            raise DataError("out of range")
+        written.extend(batch)
+    log = make_log(monkeypatch, insert)
+
+    assert log._write(["a", "bad", "b"])
+    assert written == ["a", "b"]
+    assert log.stats()["written"] == 2 and log.stats()["failed"] == 1
+
+def test_write_requeues_batch_on_connection_error(monkeypatch):
+    calls = []
+    def insert(batch):
+        calls.append(batch)
+        raise OperationalError("server has gone away")
+    log = make_log(monkeypatch, insert)
+
+    assert not log._write(["a", "b"])
+    assert calls == [["a", "b"]]  # 不逐筆重試
+    stats = log.stats()
+    assert stats["queued"] == 2 and stats["requeued"] == 2 and stats["failed"] == 0
+
+def test_write_requeues_remaining_rows_when_connection_drops_mid_fallback(monkeypatch):
+    def insert(batch):
+        if len(batch) > 1:
+            raise DataError("out of range")
+        if batch[0] == "c":
+            raise OperationalError("server has gone away")
+    log = make_log(monkeypatch, insert)
+
+    assert not log._write(["a", "b", "c", "d"])
+    stats = log.stats()
+    assert stats["written"] == 2 and stats["queued"] == 2
+
+def test_flush_counts_unwritable_events_as_failed_without_requeue(monkeypatch):
+    def insert(batch):
+        raise OperationalError("server has gone away")
+    log = make_log(monkeypatch, insert)
+    log._queue.put_nowait("a")
+    log._queue.put_nowait("b")
+
+    log.flush()
+    stats = log.stats()
+    assert stats["queued"] == 0 and stats["failed"] == 2
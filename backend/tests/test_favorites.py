@@ -0,0 +1,36 @@
+import pytest
+from app.routes.favorites import merge_operations
+
+def test_last_action_wins():
+    to_add, to_remove = merge_operations([
+        {"restaurant_id": 1, "action": "add"},
+        {"restaurant_id": 2, "action": "add"},
+        {"restaurant_id": 1, "action": "remove"},
+        {"restaurant_id": 3, "action": "remove"},
+        {"restaurant_id": 3, "action": "add"},
+    ])
+    assert to_add == [2, 3]
+    assert to_remove == [1]
+
+def test_ids_are_normalised_to_int():
+    to_add, to_remove = merge_operations([
+        {"restaurant_id": "7", "action": "add"},
+        {"restaurant_id": 7, "action": "remove"},
+    ])
+    assert to_add == []
+    assert to_remove == [7]
+
+def test_empty_operations():
+    assert merge_operations([]) == ([], [])
+
+@pytest.mark.parametrize("operation", [
+    {"restaurant_id": 1, "action": "toggle"},
+    {"restaurant_id": 1},
+    {"action": "add"},
+    {"restaurant_id": "abc", "action": "add"},
+    {"restaurant_id": None, "action": "add"},
+    "add",
+])
+def test_invalid_operations(operation):
+    with pytest.raises(ValueError):
+        merge_operations([operation])
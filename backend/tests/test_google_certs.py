@@ -0,0 +1,68 @@
+import pytest
+from app.utils import google_certs
+from app.utils.google_certs import GoogleCertVerifier
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(google_certs.time, "monotonic", fake.monotonic)
+    return fake
+
+class FakeResponse:
+    status_code = 200
+    headers = {"cache-control": "public, max-age=3600"}
+
+    def __init__(self, certs):
+        self._certs = certs
+
+    def json(self):
+        return self._certs
+
+@pytest.fixture
+def downloads(monkeypatch):
+    calls = []
+
+    def google_get(name, url):
+        calls.append(url)
+        return FakeResponse({"key": f"cert-{len(calls)}"})
+
+    monkeypatch.setattr(google_certs, "google_get", google_get)
+    return calls
+
+def test_certs_are_cached_until_expiry(clock, downloads):
+    verifier = GoogleCertVerifier(refresh_margin=0, default_ttl=3600, min_forced_interval=60)
+    assert verifier.get_certs() == {"key": "cert-1"}
+    clock.now += 3000
+    assert verifier.get_certs() == {"key": "cert-1"}
+    clock.now += 601
+    assert verifier.get_certs() == {"key": "cert-2"}
+    assert len(downloads) == 2
+
+def test_forced_refresh_is_rate_limited(clock, downloads):
+    verifier = GoogleCertVerifier(refresh_margin=0, default_ttl=3600, min_forced_interval=60)
+    verifier.get_certs()
+
+    # 剛下載過，未知 key id 不再觸發下載
+    clock.now += 30
+    assert verifier.get_certs(force=True) == {"key": "cert-1"}
+    assert len(downloads) == 1
+
+    clock.now += 31
+    assert verifier.get_certs(force=True) == {"key": "cert-2"}
+    clock.now += 10
+    assert verifier.get_certs(force=True) == {"key": "cert-2"}
+    assert len(downloads) == 2
+
+    stats = verifier.stats()
+    assert stats["forced_refreshes"] == 1 and stats["skipped_forced_refreshes"] == 2
+
+def test_forced_refresh_downloads_when_nothing_is_loaded(clock, downloads):
+    verifier = GoogleCertVerifier(refresh_margin=0, default_ttl=3600, min_forced_interval=60)
+    assert verifier.get_certs(force=True) == {"key": "cert-1"}
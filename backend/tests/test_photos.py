@@ -0,0 +1,31 @@
+import pytest
+from flask import Flask
+from app.utils import photos
+from app.utils.photos import bucket_width, negotiate_format, PHOTO_WIDTH_BUCKETS
+
+app = Flask(__name__)
+
+def test_bucket_width_rounds_up_to_bucket():
+    assert bucket_width(1) == PHOTO_WIDTH_BUCKETS[0]
+    assert bucket_width(PHOTO_WIDTH_BUCKETS[1]) == PHOTO_WIDTH_BUCKETS[1]
+    assert bucket_width(PHOTO_WIDTH_BUCKETS[1] + 1) == PHOTO_WIDTH_BUCKETS[2]
+
+def test_bucket_width_caps_at_largest_bucket():
+    assert bucket_width(PHOTO_WIDTH_BUCKETS[-1] * 10) == PHOTO_WIDTH_BUCKETS[-1]
+
+@pytest.mark.parametrize("accept, expected", [
+    ("image/avif,image/webp,*/*", "webp"),
+    ("image/webp", "webp"),
+    ("*/*", None),
+    ("image/*", None),
+    ("", None),
+])
+def test_negotiate_format_requires_explicit_webp(monkeypatch, accept, expected):
+    monkeypatch.setattr(photos, "webp_supported", lambda: True)
+    with app.test_request_context(headers={"Accept": accept}):
+        assert negotiate_format() == expected
+
+def test_negotiate_format_without_webp_encoder(monkeypatch):
+    monkeypatch.setattr(photos, "webp_supported", lambda: False)
+    with app.test_request_context(headers={"Accept": "image/webp"}):
+        assert negotiate_format() is None
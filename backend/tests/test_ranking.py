@@ -0,0 +1,70 @@
+from app.utils.ranking import rank_restaurants
+
+LAT, LNG = 25.0330, 121.5654
+
+def restaurant(id, rating=4.0, total=100, lat=LAT, lng=LNG, types=("restaurant",)):
+    return {"id": id, "rating": rating, "user_ratings_total": total, "lat": lat, "lng": lng, "types": list(types)}
+
+def ids(restaurants):
+    return [r["id"] for r in restaurants]
+
+def test_empty_list():
+    assert rank_restaurants([], LAT, LNG, 1000) == []
+
+def test_higher_smoothed_rating_ranks_first():
+    ranked = rank_restaurants([restaurant(1, rating=3.5), restaurant(2, rating=4.8)], LAT, LNG, 1000)
+    assert ids(ranked) == [2, 1]
+
+def test_few_reviews_are_pulled_toward_prior():
+    # 5 分但只有 1 則評論的餐廳不應勝過 4.6 分、上千則評論的餐廳
+    ranked = rank_restaurants(
+        [restaurant(1, rating=5.0, total=1), restaurant(2, rating=4.6, total=2000)],
+        LAT, LNG, 1000
+    )
+    assert ids(ranked) == [2, 1]
+
+def test_closer_restaurant_ranks_first():
+    near = restaurant(1, lat=LAT + 0.001)
+    far = restaurant(2, lat=LAT + 0.008)
+    assert ids(rank_restaurants([far, near], LAT, LNG, 1000)) == [1, 2]
+
+def test_distance_in_metres_and_missing_coordinates():
+    ranked = rank_restaurants([restaurant(1, lat=LAT + 0.001), restaurant(2, lat=None, lng=None)], LAT, LNG, 1000)
+    distances = {r["id"]: r["distance"] for r in ranked}
+    assert 100 <= distances[1] <= 120
+    assert distances[2] is None
+
+def test_affinity_follows_favorite_types():
+    cafe = restaurant(1, types=("cafe",))
+    bakery = restaurant(2, types=("bakery",))
+    assert ids(rank_restaurants([cafe, bakery], LAT, LNG, 1000, profile={"bakery": 1.0})) == [2, 1]
+    assert ids(rank_restaurants([cafe, bakery], LAT, LNG, 1000, profile={"cafe": 1.0})) == [1, 2]
+
+def test_ties_keep_original_order_and_input_is_not_mutated():
+    restaurants = [restaurant(i) for i in range(5)]
+    ranked = rank_restaurants(restaurants, LAT, LNG, 1000)
+    assert ids(ranked) == [0, 1, 2, 3, 4]
+    assert all("distance" not in r for r in restaurants)
+
+from app.routes.restaurants import next_cursor, page_cache_key, local_pool_page, NEARBY_PAGE_SIZE
+
+def nearby_cursor(page, source):
+    return {"tile": "wsqqq", "radius": 1000, "type": "restaurant", "mode": "hybrid",
+            "page": page, "source": source, "token": None, "issued_at": None}
+
+def test_local_pages_share_one_candidate_pool():
+    assert page_cache_key(nearby_cursor(1, "local")) == page_cache_key(nearby_cursor(4, "local"))
+    assert page_cache_key(nearby_cursor(1, "google")) != page_cache_key(nearby_cursor(2, "google"))
+
+def test_local_pages_continue_until_pool_is_used_up():
+    pool = local_pool_page([restaurant(i) for i in range(NEARBY_PAGE_SIZE * 4 + 5)])
+    cursor = nearby_cursor(0, None)
+    pages = 1
+    while (cursor := next_cursor(cursor, pool)):
+        assert cursor["source"] == "local"
+        pages += 1
+    assert pages == 5
+
+def test_local_pool_of_one_page_has_no_next_cursor():
+    pool = local_pool_page([restaurant(i) for i in range(NEARBY_PAGE_SIZE)])
+    assert next_cursor(nearby_cursor(0, None), pool) is None
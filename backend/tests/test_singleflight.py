@@ -0,0 +1,57 @@
+import threading
+import pytest
+from app.utils.singleflight import SingleFlight
+
+def wait_until(predicate):
+    for _ in range(200):
+        if predicate():
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("condition not reached")
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test_share")
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def fn():
+        calls.append(1)
+        release.wait(2)
+        return "result"
+
+    def call():
+        results.append(flight.do("key", fn))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    wait_until(lambda: flight.stats()["in_flight"] == 1)
+
+    followers = [threading.Thread(target=call) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    wait_until(lambda: flight.stats()["coalesced"] == 3)
+
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(2)
+
+    assert results == ["result"] * 4
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "executed": 1, "coalesced": 3}
+
+def test_errors_are_shared_and_not_cached():
+    flight = SingleFlight("test_error")
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do("key", fail)
+    assert flight.do("key", lambda: "ok") == "ok"
+
+def test_different_keys_run_separately():
+    flight = SingleFlight("test_keys")
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.stats()["executed"] == 2
@@ -18,6 +18,8 @@ interface Restaurant {
 const FavoritesPage = () => {
   const [favorites, setFavorites] = useState<Restaurant[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const navigate = useNavigate();
 
   useEffect(() => {
@@ -29,6 +31,7 @@ const FavoritesPage = () => {
     try {
       const response = await axios.get("/api/favorites");
       setFavorites(response.data);
+      setNextCursor(response.headers["x-next-cursor"] || null);
     } catch (error) {
       console.error("Error fetching favorites:", error);
     } finally {
@@ -36,6 +39,23 @@ const FavoritesPage = () => {
     }
   };
 
+  // 收藏列表分頁返回，以回應標頭的游標載入下一頁
+  const fetchMoreFavorites = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const response = await axios.get("/api/favorites", {
+        params: { cursor: nextCursor },
+      });
+      setFavorites((prev) => [...prev, ...response.data]);
+      setNextCursor(response.headers["x-next-cursor"] || null);
+    } catch (error) {
+      console.error("Error fetching more favorites:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleRemoveFavorite = async (restaurantId: number) => {
     try {
       await axios.delete(`/api/favorites/${restaurantId}`);
@@ -130,6 +150,14 @@ const FavoritesPage = () => {
                 </button>
               </div>
             ))}
+            {nextCursor && (
+              <button
+                onClick={fetchMoreFavorites}
+                disabled={loadingMore}
+                className="w-full py-3 text-primary bg-white rounded-xl shadow">
+                {loadingMore ? "載入中..." : "載入更多"}
+              </button>
+            )}
           </div>
         ) : (
           <div className="flex items-center justify-center h-full">
@@ -18,8 +18,14 @@ const ProfilePage = () => {
             Authorization: `Bearer ${localStorage.getItem("token")}`,
           },
         });
-        const data = await response.json();
-        setFavoritesCount(data.length || 0);
+        // 收藏列表分頁返回，總數由回應標頭提供
+        const total = response.headers.get("X-Total-Count");
+        if (total !== null) {
+          setFavoritesCount(Number(total));
+        } else {
+          const data = await response.json();
+          setFavoritesCount(data.length || 0);
+        }
       } catch (error) {
         console.error("Error fetching favorites count:", error);
       }